@@ -0,0 +1,5 @@
+# gunicorn entry point, see the Procfile.  In production set
+# DB_CREATE_ALL=0, the migrations own the schema.
+from flaskr import create_app
+
+app = create_app()
@@ -0,0 +1,79 @@
+"""Deleting a host with 1,000 games and 9,000 registrations.
+
+    python benchmarks/bench_cascade.py [games] [players_per_game]
+
+'orm' walks the tree and deletes it a row at a time, which is what the
+old delete-orphan cascades did.  'cascade' deletes just the host and
+lets ON DELETE CASCADE take the rest.  Each run seeds a fresh host.
+"""
+import time
+from sys import argv
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from common import make_app, report
+
+
+def seed(db, Host, Game, Player, Registration, games, per_game):
+    host_id = 'auth0|bench-cascade'
+    db.session.add(Host(id=host_id, name='host', email='h@bench'))
+    if Player.query.count() < per_game:
+        db.session.execute(Player.__table__.insert(), [
+            {'id': f'auth0|bench-player{i}', 'name': f'p{i}', 'email': 'p@bench'}
+            for i in range(per_game)
+        ])
+    db.session.commit()
+    start = datetime(2030, 1, 1)
+    db.session.execute(Game.__table__.insert(), [
+        {'start_time': start + timedelta(minutes=i), 'max_players': 9,
+         'num_registered': per_game, 'platform': 'bench', 'host_id': host_id}
+        for i in range(games)
+    ])
+    game_ids = [g for g, in db.session.query(Game.id).filter_by(host_id=host_id)]
+    db.session.execute(Registration.__table__.insert(), [
+        {'game_id': g, 'player_id': f'auth0|bench-player{i}'}
+        for g in game_ids for i in range(per_game)
+    ])
+    db.session.commit()
+    db.session.remove()
+    return host_id
+
+
+def main():
+    games = int(argv[1]) if len(argv) > 1 else 1000
+    per_game = int(argv[2]) if len(argv) > 2 else 9
+    from flaskr.models import db, Host, Game, Player, Registration
+
+    app = make_app()
+    results = {'games': games, 'registrations': games * per_game}
+    with app.app_context():
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *args: statements.append(1))
+
+        def orm(host):
+            for game in Game.query.filter_by(host_id=host.id):
+                for registration in Registration.query.filter_by(game_id=game.id):
+                    db.session.delete(registration)
+                db.session.delete(game)
+            db.session.delete(host)
+
+        def cascade(host):
+            db.session.delete(host)
+
+        for name, delete in [('orm', orm), ('cascade', cascade)]:
+            host_id = seed(db, Host, Game, Player, Registration, games, per_game)
+            del statements[:]
+            start = time.perf_counter()
+            delete(Host.query.get(host_id))
+            db.session.commit()
+            elapsed = time.perf_counter() - start
+            assert Game.query.filter_by(host_id=host_id).count() == 0
+            assert Registration.query.count() == 0
+            results[name] = {'ms': elapsed * 1000, 'statements': len(statements)}
+            db.session.remove()
+        results['speedup'] = results['orm']['ms'] / results['cascade']['ms']
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""jsonify throughput for /games sized payloads, stdlib vs orjson.
+
+    python benchmarks/bench_json.py [seconds]
+
+Payloads are built the way Game.format() builds them, at the page sizes
+clients actually ask for.
+"""
+from sys import argv
+from datetime import datetime, timedelta
+from flask import Flask, jsonify
+from common import rate, report
+
+PAGE_SIZES = [10, 100, 1000, 10000]
+PLATFORMS = ["Cool Poker App", "Poker.com", "Raise'm'up", "iwinyoulose.com"]
+
+
+def payload(n):
+    start = datetime(2030, 1, 1)
+    return {
+        'success': True,
+        'games': [{
+            'id': i,
+            'start_time': (start + timedelta(hours=8 * i)).ctime(),
+            'platform': PLATFORMS[i % len(PLATFORMS)],
+            'max_players': [2, 6, 9][i % 3],
+            'num_registered': i % 2,
+            'host_id': f'auth0|{i % 1000}'
+        } for i in range(n)]
+    }
+
+
+def main():
+    seconds = float(argv[1]) if len(argv) > 1 else 1.0
+    from flaskr.fastjson import setup_json
+
+    results = {}
+    for backend in ['stdlib', 'orjson']:
+        app = Flask(__name__)
+        app.config['JSON_BACKEND'] = backend
+        setup_json(app)
+        # after a fallback this is stdlib again, say so
+        name = app.config['JSON_BACKEND']
+        if name in results:
+            continue
+        results[name] = {}
+        with app.app_context():
+            for n in PAGE_SIZES:
+                data = payload(n)
+                results[name][n] = {'responses_per_sec': rate(lambda: jsonify(data), seconds)}
+
+    if 'orjson' in results:
+        results['speedup'] = {
+            n: results['orjson'][n]['responses_per_sec'] /
+            results['stdlib'][n]['responses_per_sec']
+            for n in PAGE_SIZES}
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""/games latency by page depth, page/offset mode vs cursor mode.
+
+    python benchmarks/bench_pagination.py [rows]
+
+Seeds `rows` games (default 1,000,000) then times page 1, 10, ... 10,000
+in both modes.  The cursor for page n is built from the last game on
+page n-1, which is exactly what a client walking the pages would hold.
+"""
+import time
+from sys import argv
+from statistics import median
+from datetime import datetime, timedelta
+from common import make_app, report
+
+PAGE_LENGTH = 10
+CHUNK = 10000
+
+
+def seed(db, Host, Game, rows):
+    db.session.add(Host(id='auth0|bench-host', name='host', email='h@bench'))
+    db.session.commit()
+    start = datetime(2030, 1, 1)
+    for first in range(0, rows, CHUNK):
+        db.session.execute(Game.__table__.insert(), [
+            {'start_time': start + timedelta(minutes=i // 3),
+             'max_players': 9, 'num_registered': 0,
+             'platform': 'bench', 'host_id': 'auth0|bench-host'}
+            for i in range(first, min(first + CHUNK, rows))
+        ])
+    db.session.commit()
+
+
+def latency(client, url, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        times.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.json
+    return median(times) * 1000
+
+
+def main():
+    rows = int(argv[1]) if len(argv) > 1 else 1000000
+    from flaskr.controllers import encode_cursor
+    from flaskr.models import db, Host, Game
+
+    app = make_app()
+    client = app.test_client()
+    results = {'rows': rows, 'page_length': PAGE_LENGTH, 'ms': {}}
+    with app.app_context():
+        seed(db, Host, Game, rows)
+        page = 1
+        while (page - 1) * PAGE_LENGTH < rows and page <= 10000:
+            offset_ms = latency(client, f'/games?page={page}&page_length={PAGE_LENGTH}')
+            cursor = ''
+            if page > 1:
+                last = Game.query.order_by(Game.start_time, Game.id).\
+                    offset((page - 1) * PAGE_LENGTH - 1).first()
+                cursor = encode_cursor((last.start_time, last.id))
+            cursor_ms = latency(client, f'/games?page_length={PAGE_LENGTH}&cursor={cursor}')
+            results['ms'][page] = {'page': offset_ms, 'cursor': cursor_ms}
+            page *= 10
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
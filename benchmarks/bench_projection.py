@@ -0,0 +1,42 @@
+"""Rows/sec serializing games through ORM instances vs column projection.
+
+    python benchmarks/bench_projection.py [rows] [seconds]
+
+Both sides read the same page of `rows` games (default 10,000) and turn
+it into the dicts /games returns.
+"""
+from sys import argv
+from bench_pagination import seed
+from common import make_app, rate, report
+
+
+def main():
+    rows = int(argv[1]) if len(argv) > 1 else 10000
+    seconds = float(argv[2]) if len(argv) > 2 else 3.0
+    from flaskr.models import db, Host, Game
+    from flaskr.reads import game_query, format_game_row
+
+    app = make_app()
+    with app.app_context():
+        seed(db, Host, Game, rows)
+
+        def orm():
+            games = Game.query.order_by(Game.start_time, Game.id).limit(rows)
+            assert len([g.format() for g in games]) == rows
+            db.session.remove()
+
+        def projection():
+            games = game_query().order_by(Game.start_time, Game.id).limit(rows)
+            assert len([format_game_row(g) for g in games]) == rows
+            db.session.remove()
+
+        results = {'rows': rows}
+        for name, fn in [('orm', orm), ('projection', projection)]:
+            results[name] = {'rows_per_sec': rows * rate(fn, seconds)}
+        results['speedup'] = (results['projection']['rows_per_sec'] /
+                              results['orm']['rows_per_sec'])
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
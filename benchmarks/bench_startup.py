@@ -0,0 +1,49 @@
+"""Cold start time of a worker: importing flaskr and running create_app().
+
+    python benchmarks/bench_startup.py [runs]
+
+Every run is a fresh interpreter, like a new gunicorn worker without
+preload_app.  create_app() is timed with DB_CREATE_ALL on (the default)
+and off (production, where migrations own the schema).
+"""
+import os
+import sys
+import json
+import subprocess
+from statistics import median
+from common import ROOT, bench_db_url, make_app, report
+
+RUN = '''
+import json, sys, time
+start = time.perf_counter()
+from flaskr import create_app
+imported = time.perf_counter()
+create_app(dburl=sys.argv[1])
+done = time.perf_counter()
+print(json.dumps({'import': imported - start, 'create_app': done - imported}))
+'''
+
+
+def cold_start(dburl, create_all):
+    env = dict(os.environ, DB_CREATE_ALL='1' if create_all else '0')
+    out = subprocess.run([sys.executable, '-c', RUN, dburl], cwd=ROOT, env=env,
+                         check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(out)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    dburl = bench_db_url()
+    # the schema is there already, like after a migration
+    make_app(dburl)
+
+    results = {'runs': runs}
+    for name, create_all in [('create_all', True), ('migrations_only', False)]:
+        times = [cold_start(dburl, create_all) for _ in range(runs)]
+        results[name] = {step + '_ms': median(t[step] for t in times) * 1000
+                         for step in ('import', 'create_app')}
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Requests/sec through /game<id>/join with and without the token cache.
+
+    python benchmarks/bench_token_cache.py [seconds]
+"""
+from sys import argv
+from datetime import datetime, timedelta
+from common import make_app, stub_auth, rate, report
+
+
+def main():
+    seconds = float(argv[1]) if len(argv) > 1 else 3.0
+    from flaskr import auth
+    from flaskr.models import db, Host, Player, Game
+
+    signer = stub_auth()
+    app = make_app()
+    token = signer('auth0|bench-player', ['join:game'])
+    headers = {'Authorization': f'Bearer {token}'}
+
+    with app.app_context():
+        db.session.add(Host(id='auth0|bench-host', name='host', email='h@bench'))
+        db.session.add(Player(id='auth0|bench-player', name='p', email='p@bench'))
+        game = Game(start_time=datetime.now() + timedelta(days=1), max_players=9,
+                    platform='bench', host_id='auth0|bench-host')
+        db.session.add(game)
+        db.session.commit()
+        game_id = game.id
+
+    client = app.test_client()
+
+    def join_and_leave():
+        assert client.post(f'/game{game_id}/join', headers=headers).status_code == 200
+        assert client.delete(f'/game{game_id}/unregister', headers=headers).status_code == 200
+
+    results = {}
+    for name, cache in [('no_cache', auth.TokenCache(maxsize=0)),
+                        ('cache', auth.TokenCache())]:
+        auth.token_cache = cache
+        # two requests per call
+        results[name] = {'requests_per_sec': 2 * rate(join_and_leave, seconds),
+                         'token_cache': cache.stats()}
+    results['speedup'] = (results['cache']['requests_per_sec'] /
+                          results['no_cache']['requests_per_sec'])
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
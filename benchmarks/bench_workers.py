@@ -0,0 +1,90 @@
+"""Concurrent connection capacity of gunicorn sync vs gevent workers.
+
+    python benchmarks/bench_workers.py [seconds] [workers]
+
+Starts gunicorn (app:app with gunicorn.conf.py) once per worker class,
+then holds 1, 16, 64 and 256 clients hammering /games for `seconds` each
+(default 5) and reports throughput, latency percentiles and errors.  The
+gevent run is skipped if gevent isn't installed.
+
+The gap between the two shows up when requests wait on I/O, so point
+BENCH_DATABASE_URL at a postgres over a real network for numbers that
+mean anything.  Against the local sqlite default both are CPU bound.
+"""
+import importlib.util
+import sys
+import time
+import threading
+from urllib.request import urlopen
+from bench_pagination import seed
+from common import bench_db_url, make_app, percentiles, report, start_gunicorn
+
+LEVELS = [1, 16, 64, 256]
+PATH = '/games?page_length=10'
+
+
+def load(url, clients, seconds):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        mine = []
+        failed = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                urlopen(url + PATH, timeout=10).read()
+                mine.append(time.perf_counter() - start)
+            except OSError:
+                failed += 1
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    result = {'requests_per_sec': len(latencies) / elapsed, 'errors': errors[0]}
+    result.update(percentiles(latencies))
+    return result
+
+
+def gevent_installed():
+    return importlib.util.find_spec('gevent') is not None
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    from flaskr.models import db, Host, Game
+
+    dburl = bench_db_url()
+    app = make_app(dburl)
+    with app.app_context():
+        seed(db, Host, Game, 1000)
+        db.session.remove()
+
+    results = {'workers': workers, 'seconds': seconds, 'path': PATH}
+    for worker_class in ['sync', 'gevent']:
+        if worker_class == 'gevent' and not gevent_installed():
+            results[worker_class] = 'skipped, gevent is not installed'
+            continue
+        proc, url = start_gunicorn(dburl, workers, worker_class, check_path=PATH)
+        try:
+            results[worker_class] = {clients: load(url, clients, seconds)
+                                     for clients in LEVELS}
+        finally:
+            proc.terminate()
+            proc.wait()
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import atexit
+import socket
+import tempfile
+import subprocess
+from statistics import quantiles
+from urllib.request import urlopen
+
+# Shared setup for the scripts in this directory.  Each one runs against
+# BENCH_DATABASE_URL if set (use a throwaway postgres db for real numbers),
+# otherwise a temporary sqlite file.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'tests')]
+
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ.setdefault('AUTH0_DOMAIN', 'pokester.bench')
+
+AUDIENCE = 'https://pokester.bench'
+
+
+def bench_db_url():
+    url = os.environ.get('BENCH_DATABASE_URL')
+    if url:
+        return url
+    fd, path = tempfile.mkstemp(prefix='pokester_bench_', suffix='.db')
+    os.close(fd)
+    atexit.register(os.remove, path)
+    return 'sqlite:///' + path
+
+
+def make_app(dburl=None, **config):
+    from flaskr import create_app
+    test_config = {'TESTING': True}
+    test_config.update(config)
+    return create_app(test_config, dburl=dburl or bench_db_url())
+
+
+def stub_auth():
+    """Point flaskr.auth at a local JWKS server and return a token signer."""
+    from flaskr import auth
+    from flaskr.jwks import JWKSStore
+    from jwks_server import JWKSServer, sign
+
+    server = JWKSServer().start()
+    pem = server.add_key('bench')
+    auth.jwks_store = JWKSStore(server.url)
+    auth.AUTH0_AUDIENCE = AUDIENCE
+    issuer = 'https://' + auth.AUTH0_DOMAIN + '/'
+
+    def signer(subject, permissions):
+        return sign(pem, 'bench', issuer, AUDIENCE,
+                    subject=subject, permissions=permissions)
+    return signer
+
+
+def rate(fn, seconds=3.0):
+    """Call fn repeatedly for about `seconds`, return calls per second."""
+    calls = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def report(results):
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+def percentiles(latencies):
+    """p50/p95/p99 in ms of a list of seconds."""
+    if len(latencies) < 2:
+        return {}
+    cuts = quantiles(latencies, n=100)
+    return {'p50_ms': cuts[49] * 1000, 'p95_ms': cuts[94] * 1000,
+            'p99_ms': cuts[98] * 1000}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(dburl, workers, worker_class='sync', env=None, check_path='/games'):
+    """Run app:app under gunicorn with gunicorn.conf.py, return (process, url)
+    once it answers check_path."""
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=dburl, DB_CREATE_ALL='0',
+               GUNICORN_WORKER_CLASS=worker_class, **(env or {}))
+    proc = subprocess.Popen(
+        # gunicorn 20.0 has no __main__
+        [sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()',
+         '-c', 'gunicorn.conf.py',
+         '-w', str(workers), '-b', f'127.0.0.1:{port}', '--log-level', 'warning',
+         'app:app'],
+        # keep stdout for the report
+        cwd=ROOT, env=env, stdout=sys.stderr)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while True:
+        try:
+            urlopen(url + check_path, timeout=1).read()
+            return proc, url
+        except OSError:
+            if proc.poll() is not None or time.time() > deadline:
+                proc.kill()
+                raise RuntimeError(f'gunicorn -k {worker_class} did not start')
+            time.sleep(0.2)
@@ -0,0 +1,116 @@
+"""Dump query plans for the SQL behind each endpoint.
+
+    python benchmarks/explain_queries.py <database url> [--before]
+
+Plans come from EXPLAIN ANALYZE on postgres and EXPLAIN QUERY PLAN on
+sqlite.  The statements are built from the same ORM queries and UPDATEs
+the views use, with ids picked out of the database.  EXPLAIN ANALYZE runs
+the writes for real, so everything is rolled back afterwards.
+
+--before explains them again inside a transaction with the hot path
+indexes dropped, then rolls back, so you get both sides of the index
+migration from one postgres database.  DROP INDEX locks the tables until the
+rollback, so point this at a copy, not production.
+"""
+from sys import argv
+from sqlalchemy import and_, func, tuple_
+from common import make_app
+
+# postgres DDL is transactional, so these are undone by the rollback.
+# (pysqlite commits DDL behind our back, hence postgres only.)
+DROP_INDEXES = [
+    'DROP INDEX IF EXISTS ix_game_start_time_id',
+    'DROP INDEX IF EXISTS ix_game_host_id',
+    'DROP INDEX IF EXISTS ix_registration_player_id',
+    'DROP INDEX IF EXISTS ix_game_platform_start_time',
+    'DROP INDEX IF EXISTS ix_game_open_start_time',
+    'DROP INDEX IF EXISTS ix_game_fill',
+    'ALTER TABLE registration DROP CONSTRAINT IF EXISTS uq_registration_game_player',
+]
+
+
+def endpoint_queries(db, Game, Player, Registration):
+    reg = Registration.query.first()
+    game = Game.query.order_by(Game.start_time, Game.id).offset(
+        Game.query.count() // 2).first()
+    return [
+        ('GET /games count', db.session.query(func.count(Game.id))),
+        ('GET /games page 100', Game.query.order_by(Game.start_time, Game.id).
+            limit(10).offset(990)),
+        ('GET /games cursor', Game.query.order_by(Game.start_time, Game.id).
+            filter(tuple_(Game.start_time, Game.id) > (game.start_time, game.id)).
+            limit(11)),
+        ('GET /games?platform=', Game.query.filter(Game.platform == game.platform).
+            order_by(Game.start_time, Game.id).limit(11)),
+        ('GET /games?open_seats=true', Game.query.filter(
+            Game.num_registered < Game.max_players).
+            order_by(Game.start_time, Game.id).limit(11)),
+        ('GET /games?sort=fill', Game.query.order_by(
+            Game.max_players - Game.num_registered, Game.start_time, Game.id).
+            limit(11)),
+        ('GET /game<id>/players', Player.query.join(Registration).
+            filter(Registration.game_id == reg.game_id)),
+        # models.reserve_seat and release_seat
+        ('POST /game<id>/join seat', Game.__table__.update().where(and_(
+            Game.id == game.id, Game.num_registered < Game.max_players)).
+            values(num_registered=Game.num_registered + 1)),
+        ('DELETE /game<id>/unregister registration', Registration.__table__.delete().
+            where(and_(Registration.game_id == reg.game_id,
+                       Registration.player_id == reg.player_id))),
+        ('DELETE /game<id>/unregister seat', Game.__table__.update().
+            where(Game.id == reg.game_id).
+            values(num_registered=Game.num_registered - 1)),
+        ('host games', Game.query.filter_by(host_id=game.host_id)),
+    ]
+
+
+def explain(connection, dialect, query):
+    # an ORM query, or a core UPDATE/DELETE
+    statement = getattr(query, 'statement', query)
+    compiled = statement.compile(dialect=dialect)
+    if compiled.positional:
+        params = [compiled.params[name] for name in compiled.positiontup]
+    else:
+        params = compiled.params
+    prefix = 'EXPLAIN ANALYZE ' if dialect.name == 'postgresql' else 'EXPLAIN QUERY PLAN '
+    rows = connection.execute(prefix + str(compiled), params).fetchall()
+    return [' '.join(str(col) for col in row) for row in rows]
+
+
+def dump(title, connection, dialect, queries):
+    print(f'==== {title} ====')
+    for name, query in queries:
+        print(f'-- {name}')
+        for line in explain(connection, dialect, query):
+            print('   ' + line)
+    print()
+
+
+def main():
+    if len(argv) < 2:
+        print('Usage:  explain_queries.py <database url> [--before]')
+        return 1
+    from flaskr.models import db, Game, Player, Registration
+
+    app = make_app(argv[1])
+    with app.app_context():
+        queries = endpoint_queries(db, Game, Player, Registration)
+        dialect = db.engine.dialect
+        with db.engine.connect() as connection:
+            if '--before' in argv[2:]:
+                if dialect.name != 'postgresql':
+                    print('--before needs postgres')
+                    return 1
+                transaction = connection.begin()
+                for statement in DROP_INDEXES:
+                    connection.execute(statement)
+                dump('without indexes', connection, dialect, queries)
+                transaction.rollback()
+            transaction = connection.begin()
+            dump('with indexes', connection, dialect, queries)
+            transaction.rollback()
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,316 @@
+"""HTTP load test of every endpoint with a realistic request mix.
+
+    python benchmarks/load_test.py [--games 10000] [--players 2000] [--hosts 200]
+                                   [--clients 16] [--seconds 30] [--workers 2]
+                                   [--worker-class sync] [--mix games=40,...]
+                                   [--seed 0] [--out results.json]
+
+Seeds the database (BENCH_DATABASE_URL, or a throwaway sqlite file) at
+the given scale with populate_test_db.populate, starts gunicorn on it, and has `clients` threads send a
+weighted mix of requests for `seconds`.  Writes go through real auth:
+tokens are signed with a key from a local stand in for Auth0's JWKS,
+which the server is pointed at with AUTH0_JWKS_URL.
+
+Everything is driven by --seed, so two runs against the same code make
+the same data and the same sequence of requests per client.  The JSON
+report has p50/p95/p99 latency, throughput and status counts per
+operation and overall, ready to diff against another run.
+
+Unregister gives back a seat the same client joined, and is sent as a
+join (and counted as one) until it has one.  Half the /games reads are
+cursor pages, each client scrolling on from the next_cursor it last got.
+The report goes to stdout (and --out if given); the server's own output goes to
+stderr so it can be piped.
+
+4xx answers are part of the mix (a full game, a seat already taken) and
+are counted by status; only 5xx and connection failures are errors.
+Game creation and start_time edits need postgres, sqlite refuses the
+start_time strings the API accepts.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from urllib.parse import quote
+from common import (AUDIENCE, bench_db_url, make_app, percentiles, report,
+                    start_gunicorn)
+from populate_test_db import PLATFORMS, host_id, player_id, populate
+
+MIX = {
+    'games': 40,
+    'game_players': 20,
+    'rosters': 5,
+    'join': 12,
+    'unregister': 8,
+    'create': 5,
+    'edit': 6,
+    'delete': 4,
+}
+DOMAIN = 'pokester.bench'
+HOST_PERMISSIONS = ['create:game', 'edit:game', 'delete:game']
+PLAYER_PERMISSIONS = ['join:game']
+
+
+class Games:
+    """Game ids the clients know about, by host, shared between threads."""
+
+    def __init__(self, rows):
+        self._lock = threading.Lock()
+        self.ids = [game_id for game_id, _ in rows]
+        self.by_host = {}
+        for game_id, host in rows:
+            self.by_host.setdefault(host, []).append(game_id)
+
+    def pick(self, rng):
+        with self._lock:
+            return rng.choice(self.ids)
+
+    def pick_hosted(self, rng, host_id):
+        with self._lock:
+            hosted = self.by_host.get(host_id)
+            return rng.choice(hosted) if hosted else None
+
+    def remove(self, game_id, host_id):
+        with self._lock:
+            if game_id in self.by_host.get(host_id, ()):
+                self.by_host[host_id].remove(game_id)
+                self.ids.remove(game_id)
+
+
+class Client:
+
+    def __init__(self, url, rng, games, host_tokens, player_tokens):
+        self.url = url
+        self.rng = rng
+        self.games = games
+        self.host_tokens = host_tokens
+        self.player_tokens = player_tokens
+        # (game id, token) for each seat this client has taken and not
+        # given back, so unregister hits seats that exist
+        self.seats = []
+        # where this client's cursor walk through /games has got to:
+        # (filters, next_cursor), None to start a new one
+        self.scroll = None
+
+    def resolve(self, op):
+        """The op to send for one picked from the mix.  Nothing to
+        unregister until this client has joined something, so it joins."""
+        if op == 'unregister' and not self.seats:
+            return 'join'
+        return op
+
+    def request(self, op):
+        """Returns (status, seconds) for one `op` from the mix."""
+        method, path, body, token, done = getattr(self, 'op_' + op)()
+        payload = None
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = 'Bearer ' + token
+        data = json.dumps(body).encode() if body is not None else None
+        start = time.perf_counter()
+        try:
+            with urlopen(Request(self.url + path, data=data, method=method,
+                                 headers=headers), timeout=30) as response:
+                payload = response.read()
+                status = response.status
+        except HTTPError as e:
+            e.read()
+            status = e.code
+        elapsed = time.perf_counter() - start
+        if done:
+            done(status, payload)
+        return status, elapsed
+
+    # op_<name> for each entry in MIX returns
+    # (method, path, json body, token, callback(status, body) or None)
+
+    def op_games(self):
+        # half page numbers, half cursor reads that scroll on from this
+        # client's last cursor page, like the games page does
+        if self.rng.random() < 0.5:
+            return self.games_cursor()
+        page = self.rng.randint(1, 5)
+        query = f'page={page}&page_length=10' + self.games_filters()
+        return 'GET', '/games?' + query, None, None, None
+
+    def games_filters(self):
+        query = ''
+        if self.rng.random() < 0.3:
+            query += '&platform=' + quote(self.rng.choice(PLATFORMS))
+        if self.rng.random() < 0.2:
+            query += '&open_seats=1'
+        return query
+
+    def games_cursor(self):
+        # a fresh visitor now and then, and whenever the walk ran out
+        if self.scroll is None or self.rng.random() < 0.1:
+            self.scroll = (self.games_filters(), '')
+        filters, cursor = self.scroll
+
+        def done(status, body):
+            next_cursor = json.loads(body).get('next_cursor') if status == 200 else None
+            self.scroll = (filters, next_cursor) if next_cursor else None
+        query = f'cursor={quote(cursor)}&page_length=10' + filters
+        return 'GET', '/games?' + query, None, None, done
+
+    def op_game_players(self):
+        return 'GET', f'/game{self.games.pick(self.rng)}/players', None, None, None
+
+    def op_rosters(self):
+        ids = {self.games.pick(self.rng) for _ in range(10)}
+        return 'GET', '/games/players?ids=' + ','.join(map(str, ids)), None, None, None
+
+    def op_join(self):
+        game_id = self.games.pick(self.rng)
+        token = self.rng.choice(self.player_tokens)
+
+        def done(status, body):
+            if status == 200:
+                self.seats.append((game_id, token))
+        return 'POST', f'/game{game_id}/join', None, token, done
+
+    def op_unregister(self):
+        # give back a seat this client took
+        game_id, token = self.seats.pop(self.rng.randrange(len(self.seats)))
+        return 'DELETE', f'/game{game_id}/unregister', None, token, None
+
+    def op_create(self):
+        host_id, token = self.rng.choice(self.host_tokens)
+        start = datetime(2030, 6, 1) + timedelta(minutes=self.rng.randrange(60 * 24 * 30))
+        body = {'start_time': start.isoformat(), 'max_players': self.rng.randint(2, 9),
+                'platform': self.rng.choice(PLATFORMS)}
+        return 'POST', '/game/create', body, token, None
+
+    def op_edit(self):
+        host_id, token = self.rng.choice(self.host_tokens)
+        game_id = self.games.pick_hosted(self.rng, host_id) or self.games.pick(self.rng)
+        body = {'platform': self.rng.choice(PLATFORMS)}
+        return 'PATCH', f'/game{game_id}/edit', body, token, None
+
+    def op_delete(self):
+        host_id, token = self.rng.choice(self.host_tokens)
+        game_id = self.games.pick_hosted(self.rng, host_id) or self.games.pick(self.rng)
+
+        def done(status, body):
+            if status == 200:
+                self.games.remove(game_id, host_id)
+        return 'DELETE', f'/game{game_id}', None, token, done
+
+
+def parse_mix(spec):
+    mix = dict(MIX)
+    if spec:
+        mix = {}
+        for part in spec.split(','):
+            op, weight = part.split('=')
+            if op not in MIX:
+                raise SystemExit(f'unknown operation {op!r}, pick from {", ".join(MIX)}')
+            mix[op] = float(weight)
+    return mix
+
+
+def summarize(samples, elapsed):
+    latencies = [seconds for status, seconds in samples if status != 'error']
+    statuses = {}
+    errors = 0
+    for status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if status == 'error' or status >= 500:
+            errors += 1
+    result = {'requests': len(samples), 'requests_per_sec': len(samples) / elapsed,
+              'statuses': statuses, 'errors': errors}
+    result.update(percentiles(latencies))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--hosts', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='sync')
+    parser.add_argument('--mix', help='op=weight,... out of ' + ', '.join(MIX))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='also write the report here')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    from flaskr.models import db, Game
+    from jwks_server import JWKSServer, sign
+
+    jwks = JWKSServer().start()
+    pem = jwks.add_key('load')
+    env = {'AUTH0_JWKS_URL': jwks.url, 'AUTH0_DOMAIN': DOMAIN, 'AUTH0_AUDIENCE': AUDIENCE}
+    issuer = f'https://{DOMAIN}/'
+
+    dburl = bench_db_url()
+    app = make_app(dburl)
+    with app.app_context():
+        populate(db.engine, args.hosts, args.players, args.games, args.seed)
+        games = Games(db.session.query(Game.id, Game.host_id).order_by(Game.id).all())
+        dialect = db.engine.dialect.name
+        db.session.remove()
+
+    host_ids = map(host_id, range(args.hosts))
+    host_tokens = [(h, sign(pem, 'load', issuer, AUDIENCE, subject=h,
+                            permissions=HOST_PERMISSIONS)) for h in host_ids]
+    player_ids = map(player_id, range(args.players))
+    player_tokens = [sign(pem, 'load', issuer, AUDIENCE, subject=p,
+                          permissions=PLAYER_PERMISSIONS) for p in player_ids]
+
+    proc, url = start_gunicorn(dburl, args.workers, args.worker_class, env=env)
+    samples = {op: [] for op in mix}
+    lock = threading.Lock()
+    ops, weights = list(mix), list(mix.values())
+
+    def run(i):
+        rng = random.Random(f'{args.seed}-{i}')
+        client = Client(url, rng, games, host_tokens, player_tokens)
+        mine = {op: [] for op in mix}
+        while time.perf_counter() < deadline:
+            op = client.resolve(rng.choices(ops, weights)[0])
+            try:
+                mine.setdefault(op, []).append(client.request(op))
+            except OSError:
+                mine[op].append(('error', 0.0))
+        with lock:
+            for op, values in mine.items():
+                samples.setdefault(op, []).extend(values)
+
+    try:
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(args.clients)]
+        start = time.perf_counter()
+        deadline = start + args.seconds
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait()
+        jwks.stop()
+
+    results = {
+        'config': {'games': args.games, 'players': args.players, 'hosts': args.hosts,
+                   'clients': args.clients, 'seconds': args.seconds,
+                   'workers': args.workers, 'worker_class': args.worker_class,
+                   'mix': mix, 'seed': args.seed, 'database': dialect},
+        'operations': {op: summarize(values, elapsed) for op, values in samples.items()},
+        'overall': summarize([s for values in samples.values() for s in values], elapsed),
+    }
+    report(results)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
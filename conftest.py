@@ -0,0 +1 @@
+pytest_plugins = ['flaskr.querybudget', 'pytester']
@@ -1,9 +1,15 @@
 import os
 from flask import Flask
 from flask_cors import CORS
-from .models import setup_db
+from .models import db, setup_db
+from .replicas import setup_replicas
 from .controllers import register_views
 from .auth import setup_auth
+from .cache import setup_cache
+from .events import setup_events
+from .fastjson import setup_json
+from .metrics import setup_metrics
+from .querylog import setup_querylog
 
 def create_app(test_config=None, dburl=None):
     app = Flask(__name__)
@@ -15,16 +21,26 @@ def create_app(test_config=None, dburl=None):
     dbpath = dburl or os.environ.get('DATABASE_URL')
     app.config['SECRET_KEY'] = os.environ['SECRET_KEY']
     setup_db(app, dbpath)
+    replicas = setup_replicas(app)
 
+    setup_json(app)
     CORS(app)
 
     @app.after_request
     def after_request(response):
         response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization, true')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization, If-None-Match, true')
+        response.headers.add('Access-Control-Expose-Headers', 'ETag')
         response.headers.add('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
         return response
 
+    engines = {'primary': db.engine}
+    if replicas:
+        engines.update((f'replica{i}', engine) for i, engine in enumerate(replicas.engines))
+    setup_metrics(app, engines)
+    setup_querylog(app, engines)
+    setup_cache(app)
+    setup_events(app)
     register_views(app)
     setup_auth(app)
 
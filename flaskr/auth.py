@@ -1,15 +1,17 @@
 from os import environ
 from functools import wraps
-import json
-from flask import session, redirect, url_for, jsonify, request
+from collections import OrderedDict
+from hashlib import sha256
+import threading
+import time
+from flask import session, redirect, url_for, jsonify, request, g
 from dotenv import load_dotenv, find_dotenv
 # from authlib.integrations.flask_client import OAuth
 
 # @TODO see if I can just use from urllib import urlencode, url open
 # to avoid the six dependancy
 from six.moves.urllib.parse import urlencode
-from six.moves.urllib.request import urlopen
-from jose import jwt
+from .jwks import JWKSStore
 
 ENV_FILE = find_dotenv()
 if ENV_FILE:
@@ -24,6 +26,13 @@ AUTH0_AUDIENCE = environ.get('AUTH0_AUDIENCE')
 
 ALGORITHMS = ["RS256"]
 
+# parsed signing keys, shared by every request in this process
+# AUTH0_JWKS_URL points somewhere else, like the load test's stand in
+AUTH0_JWKS_URL = environ.get('AUTH0_JWKS_URL', AUTH0_BASE_URL + '/.well-known/jwks.json')
+jwks_store = JWKSStore(AUTH0_JWKS_URL)
+
+TOKEN_CACHE_SIZE = int(environ.get('TOKEN_CACHE_SIZE', 4096))
+
 
 class AuthError(Exception):
     def __init__(self, error, status_code):
@@ -31,6 +40,71 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
+class TokenCache:
+    """Payloads of tokens we've already verified, kept until they expire.
+
+    The SPA sends the same bearer token for hours, so there's no point
+    checking its RS256 signature on every request.  Entries are keyed by a
+    hash of the token so raw tokens don't sit around in memory, and the
+    least recently used entry goes once `maxsize` is reached.
+    maxsize=0 turns the cache off.
+    """
+
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE, clock=time.time):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token):
+        return sha256(token.encode()).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            exp, payload = entry
+            if exp <= self._clock():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, token, payload):
+        exp = payload.get('exp')
+        # a token without an expiry would be good forever, don't keep it
+        if not self.maxsize or not isinstance(exp, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (exp, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries)
+        }
+
+
+token_cache = TokenCache()
+
+
 # Format error response and append status code
 def get_token_auth_header():
     """Obtains the Access Token from the Authorization Header
@@ -66,8 +140,12 @@ def get_token_auth_header():
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen("https://" + AUTH0_DOMAIN + "/.well-known/jwks.json")
-    jwks = json.loads(jsonurl.read())
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+    # jose is imported on first use, not at startup.  It drags in ecdsa,
+    # which spends over half a second building tables on import.
+    from jose import jwt
     try:
         unverified_header = jwt.get_unverified_header(token)
     except Exception:
@@ -75,22 +153,13 @@ def verify_decode_jwt(token):
             "code": "invalid_header",
             "description": "Authorization malformed."
             }, 401)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
             }, 401)
-    for key in jwks["keys"]:
-        if key["kid"] == unverified_header["kid"]:
-            rsa_key = {
-                "kty": key["kty"],
-                "kid": key["kid"],
-                "use": key["use"],
-                "n": key["n"],
-                "e": key["e"]
-            }
-    if not rsa_key:
+    rsa_key = jwks_store.get_key(unverified_header['kid'])
+    if rsa_key is None:
         raise AuthError({
             "code": "invalid_header",
             "description": "Unable to find appropriate key"
@@ -98,7 +167,7 @@ def verify_decode_jwt(token):
     try:
         payload = jwt.decode(
             token,
-            rsa_key,
+            [rsa_key],
             algorithms=ALGORITHMS,
             audience=AUTH0_AUDIENCE,
             issuer="https://" + AUTH0_DOMAIN + "/"
@@ -119,6 +188,7 @@ def verify_decode_jwt(token):
             "code": "invalid_header",
             "description": "Unable to parse authentication token."
             }, 401)
+    token_cache.put(token, payload)
     return payload
 
 
@@ -143,9 +213,14 @@ def requires_auth(permission=''):
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
+            start = time.perf_counter()
+            try:
+                token = get_token_auth_header()
+                payload = verify_decode_jwt(token)
+                check_permissions(permission, payload)
+            finally:
+                # reported by /metrics
+                g.auth_seconds = time.perf_counter() - start
             return f(payload, *args, **kwargs)
 
         return wrapper
@@ -0,0 +1,278 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha1
+from uuid import uuid4
+from flask import Response, json
+from .settings import setting, OFF
+
+# Rendered JSON for the read endpoints.  Keys carry version stamps, and the
+# write views bump those versions instead of hunting down entries to
+# delete: the old entries just stop being asked for and age out.
+#
+#   'games'          every /games page (any game changed, or a new one)
+#   'game:<id>'      /game<id>/players
+#   'players'        every roster (a player changed their name or email)
+#
+# The same stamps make the ETags, so a client holding a current ETag gets a
+# 304 without us touching the database.  Each backend also has an epoch
+# that changes if its versions are lost (restart, flush) so a reset
+# counter can't hand out an old ETag for new data.
+
+RESPONSE_CACHE_SIZE = 1024
+# upper bound on how long anything lives, so a missed bump can't be forever
+RESPONSE_CACHE_TTL = 300
+
+
+class MemoryBackend:
+    """LRU in this process.  Only safe with a single worker process, since
+    the other workers never see this process's version bumps."""
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, clock=time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._entries = OrderedDict()
+        # versions are tiny and must never be evicted
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.epoch = uuid4().hex
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def versions(self, names):
+        with self._lock:
+            return [self.epoch] + [self._versions.get(name, 0) for name in names]
+
+    def bump(self, names):
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+
+class RedisBackend:
+    """Shared between every worker through a redis-like client."""
+
+    def __init__(self, client, prefix='pokester:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url):
+        # optional dependency, only needed if you ask for it
+        import redis
+        return cls(redis.from_url(url))
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def versions(self, names):
+        # the epoch rides along in the same round trip
+        epoch_key = self.prefix + 'epoch'
+        epoch, *values = self.client.mget(
+            [epoch_key] + [self.prefix + 'v:' + name for name in names])
+        if epoch is None:
+            # first worker to get here wins
+            self.client.set(epoch_key, uuid4().hex, nx=True)
+            epoch = self.client.get(epoch_key)
+        return [epoch.decode()] + [int(v) if v is not None else 0 for v in values]
+
+    def bump(self, names):
+        for name in names:
+            self.client.incr(self.prefix + 'v:' + name)
+
+
+class LocalRedis:
+    """Stand in for a redis client, enough of the API for RedisBackend
+    here and in events.py.  Lets you run the shared backend code path
+    without a redis server."""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._data = {}
+        # channel -> {LocalPubSub}
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= self._clock():
+                del self._data[key]
+                return None
+            return value
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        if isinstance(value, str):
+            value = value.encode()
+        if nx and self.get(key) is not None:
+            return None
+        expires = self._clock() + ex if ex else None
+        with self._lock:
+            self._data[key] = (expires, value)
+        return True
+
+    def incr(self, key):
+        with self._lock:
+            expires, value = self._data.get(key, (None, b'0'))
+            value = str(int(value) + 1).encode()
+            self._data[key] = (expires, value)
+            return int(value)
+
+    def publish(self, channel, message):
+        if isinstance(message, str):
+            message = message.encode()
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for pubsub in subscribers:
+            pubsub._messages.put({'type': 'message', 'channel': channel.encode(),
+                                  'data': message})
+        return len(subscribers)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return LocalPubSub(self)
+
+
+class LocalPubSub:
+    """What LocalRedis.pubsub() hands out."""
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._messages = queue.Queue()
+
+    def subscribe(self, *channels):
+        with self._redis._lock:
+            for channel in channels:
+                self._redis._channels.setdefault(channel, set()).add(self)
+
+    def listen(self):
+        while True:
+            yield self._messages.get()
+
+
+class ResponseCache:
+
+    def __init__(self, backend, ttl=RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.not_modified = 0
+
+    def json_response(self, key, versions, render, if_none_match=None):
+        """Cached JSON for key, rendering it with render() on a miss.
+
+        if_none_match is the request's werkzeug ETags; a match is a 304.
+        Concurrent misses on the same key wait for the first one instead of
+        all going to the database (single flight).
+        """
+        stamps = self.backend.versions(versions)
+        full_key = key + '|' + ','.join(map(str, stamps))
+        etag = sha1(full_key.encode()).hexdigest()
+
+        if if_none_match and if_none_match.contains(etag):
+            self.not_modified += 1
+            return self._response(None, etag, status=304)
+
+        body = self.backend.get(full_key)
+        if body is not None:
+            self.hits += 1
+            return self._response(body, etag)
+
+        with self._inflight_lock:
+            waiting = self._inflight.get(full_key)
+            if waiting is None:
+                done = self._inflight[full_key] = threading.Event()
+
+        if waiting is not None:
+            waiting.wait()
+            body = self.backend.get(full_key)
+            if body is not None:
+                self.coalesced += 1
+                return self._response(body, etag)
+            # the leader failed (a 404, say), so do it ourselves
+
+        self.misses += 1
+        try:
+            body = json.dumps(render()).encode()
+            self.backend.set(full_key, body, self.ttl)
+        finally:
+            if waiting is None:
+                with self._inflight_lock:
+                    del self._inflight[full_key]
+                done.set()
+        return self._response(body, etag)
+
+    def bump(self, *names):
+        self.backend.bump(names)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'not_modified': self.not_modified
+        }
+
+    @staticmethod
+    def _response(body, etag, status=200):
+        response = Response(body, status=status, mimetype='application/json')
+        response.set_etag(etag)
+        # let clients keep it, but make them ask before using it
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+def make_backend(spec):
+    if spec == 'memory':
+        return MemoryBackend()
+    if spec == 'local':
+        return RedisBackend(LocalRedis())
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend.from_url(spec)
+    raise ValueError(f'Unknown response cache {spec!r}')
+
+
+def setup_cache(app):
+    # RESPONSE_CACHE: 'memory', 'local' (the redis stand in) or a redis url.
+    # Off unless asked for, and 0/false/no/off are off too.
+    spec = setting(app, 'RESPONSE_CACHE')
+    if isinstance(spec, bool):
+        spec = 'memory' if spec else None
+    elif spec is not None and str(spec).lower() in OFF:
+        spec = None
+    cache = None
+    if spec:
+        cache = ResponseCache(make_backend(spec), ttl=int(
+            setting(app, 'RESPONSE_CACHE_TTL', RESPONSE_CACHE_TTL)))
+    app.extensions['response_cache'] = cache
+    return cache
@@ -1,13 +1,138 @@
 import sys
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime
 from functools import wraps
-from flask import (request, jsonify, abort,
+from six.moves.urllib.parse import urlencode
+from flask import (request, jsonify, abort, Response, stream_with_context,
                    render_template, redirect, url_for)
-from .models import Host, Game, Player, Registration, rollback, close_session
+from sqlalchemy import func, tuple_
+from sqlalchemy.exc import IntegrityError
+from .models import (db, Host, Game, Player, Registration, close_session,
+                     unit_of_work, reserve_seat, release_seat)
+from .export import export_games
+from .replicas import read_only
+from .reads import game_query, format_game_row, PLAYER_COLUMNS, format_player_row
 from .auth import requires_auth as req_auth
 from .auth import requires_auth_dummy, AuthError
 
 PAGE_LENGTH = 10
-
+# most games one /games page can hold
+MAX_PAGE_LENGTH = 100
+# most games one /games/players request can ask for
+MAX_ROSTER_IDS = 100
+
+
+OPEN_SEATS = Game.max_players - Game.num_registered
+
+# sort name -> leading sort key columns.  Every sort ends with
+# (start_time, id) so the order is total and a cursor pins down one spot.
+# Each has a supporting index in models.py.
+SORTS = {
+    'start_time': (),
+    # fullest games first
+    'fill': (OPEN_SEATS,),
+}
+
+
+# Cursors are opaque to clients, they just hand back whatever next_cursor
+# they were given.  Inside it's the sort and the sort key of the last game
+# on the page: the SORTS columns, then start_time and id.
+def encode_cursor(key, sort='start_time'):
+    *leading, start_time, game_id = key
+    key = [sort] + list(leading) + [start_time.isoformat(), game_id]
+    return urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor, sort='start_time'):
+    try:
+        cursor_sort, *leading, start_time, game_id = json.loads(
+            urlsafe_b64decode(cursor.encode()))
+        if cursor_sort != sort or len(leading) != len(SORTS[sort]):
+            raise ValueError(cursor_sort)
+        return tuple(int(v) for v in leading) + (
+            datetime.fromisoformat(start_time), int(game_id))
+    except Exception:
+        abort(400, description='Invalid cursor')
+
+
+def parse_time_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, description=f'{name} must be an ISO 8601 date/time')
+
+
+def filter_games(q):
+    # ?platform=&host_id=&start_after=&start_before=&open_seats=true
+    platform = request.args.get('platform')
+    if platform is not None:
+        q = q.filter(Game.platform == platform)
+    host_id = request.args.get('host_id')
+    if host_id is not None:
+        q = q.filter(Game.host_id == host_id)
+    start_after = parse_time_arg('start_after')
+    if start_after is not None:
+        q = q.filter(Game.start_time >= start_after)
+    start_before = parse_time_arg('start_before')
+    if start_before is not None:
+        q = q.filter(Game.start_time < start_before)
+    if request.args.get('open_seats', '').lower() in ('1', 'true', 'yes'):
+        # matches the partial index's predicate exactly so postgres uses it
+        q = q.filter(Game.num_registered < Game.max_players)
+    return q
+
+
+def load_rosters(game_ids):
+    # {game_id: [player, ...]} for every id that's a game, in one query.
+    # The outer joins keep games with nobody registered.
+    rows = db.session.query(Game.id, *PLAYER_COLUMNS).\
+        outerjoin(Registration, Registration.game_id == Game.id).\
+        outerjoin(Player, Player.id == Registration.player_id).\
+        filter(Game.id.in_(game_ids)).\
+        order_by(Game.id, Registration.id)
+    rosters = {}
+    for game_id, *player in rows:
+        roster = rosters.setdefault(game_id, [])
+        if player[2] is not None:
+            roster.append(format_player_row(player))
+    return rosters
+
+
+def parse_page_length():
+    value = request.args.get('page_length')
+    if value is None:
+        return PAGE_LENGTH
+    try:
+        page_length = int(value)
+    except ValueError:
+        page_length = 0
+    if not 1 <= page_length <= MAX_PAGE_LENGTH:
+        abort(400, description=f'page_length must be 1 to {MAX_PAGE_LENGTH}')
+    return page_length
+
+
+def parse_page():
+    try:
+        page = int(request.args.get('page', 1))
+    except ValueError:
+        page = 0
+    if page < 1:
+        abort(400, description='page must be a whole number from 1')
+    return page
+
+
+def parse_ids_arg(name):
+    try:
+        ids = [int(i) for i in request.args.get(name, '').split(',') if i]
+    except ValueError:
+        abort(400, description=f'{name} must be comma separated game ids')
+    if not ids or len(ids) > MAX_ROSTER_IDS:
+        abort(400, description=f'{name} needs 1 to {MAX_ROSTER_IDS} game ids')
+    return ids
 
 
 def register_views(app):
@@ -25,44 +150,162 @@ def register_views(app):
             id_ = request.args.get('user_id', type=str)
         return id_
 
+    cache = app.extensions.get('response_cache')
+
+    def cached_json(versions):
+        # versions(**view_args) names the version stamps the response
+        # depends on (see cache.py).  The view returns a dict.
+        def decorator(f):
+            @wraps(f)
+            def wrapper(**kwargs):
+                if cache is None:
+                    return jsonify(f(**kwargs))
+                key = request.path + '?' + urlencode(sorted(request.args.items(multi=True)))
+                return cache.json_response(key, versions(**kwargs),
+                                           lambda: f(**kwargs),
+                                           request.if_none_match)
+            return wrapper
+        return decorator
+
+    # A cache miss is stored under version stamps the last write just
+    # bumped, and a replica that hasn't caught up would store its stale
+    # rows under them until the TTL, and hand out an ETag that 304s until
+    # the next write.  So with the cache on, cached views read the primary.
+    replica_read = read_only if cache is None else (lambda view: view)
+
+    def invalidate(*names):
+        # call after the commit, never before.  A cache outage is logged,
+        # not a 500 for a write that happened; RESPONSE_CACHE_TTL bounds
+        # how long anything stale can be served.
+        if cache is not None:
+            try:
+                cache.bump(*names)
+            except Exception:
+                app.logger.exception(f'Could not bump {", ".join(names)}')
+
+    events = app.extensions.get('seat_events')
+
+    def announce(event, data):
+        # tell the open /games/events streams, also only after the commit.
+        # The write has happened by now, so a broker outage is logged
+        # rather than turned into an error the client would retry.
+        if events is not None:
+            try:
+                events.publish(event, data)
+            except Exception:
+                app.logger.exception(f'Could not publish {event} event')
+
     @app.route('/home')
     def index():
-        return render_template('index.html')
+        return render_template('index.html', seat_events=events is not None)
+
+    def games_versions():
+        if request.args.get('include') == 'players':
+            return ['games', 'players']
+        return ['games']
+
+    def format_games(rows):
+        formatted = [format_game_row(row) for row in rows]
+        if request.args.get('include') == 'players' and formatted:
+            rosters = load_rosters([g['id'] for g in formatted])
+            for game in formatted:
+                game['players'] = rosters.get(game['id'], [])
+        return formatted
 
     @app.route('/games', methods=['GET'])
+    @cached_json(games_versions)
+    @replica_read
     def games():
-        # Return a list of games paginated
-        # @TODO Optional json filters
-        # default sorted by start time and n players
+        # Return a list of games paginated, optionally filtered
+        # (see filter_games) and sorted by ?sort=start_time|fill.
+        # ?include=players adds each game's roster.
+
+        page_length = parse_page_length()
+        sort = request.args.get('sort', 'start_time')
+        if sort not in SORTS:
+            abort(400, description=f'sort must be one of {", ".join(SORTS)}')
+        key_columns = SORTS[sort] + (Game.start_time, Game.id)
+
+        # cursor mode: ?cursor= for the first page then whatever came back
+        # as next_cursor.  No count() and no OFFSET, so page 10,000 costs
+        # the same as page 1.
+        if 'cursor' in request.args:
+            # the sort key rides along at the end of each row for the cursor
+            q = filter_games(game_query(*key_columns)).order_by(*key_columns)
+            cursor = request.args['cursor']
+            if cursor:
+                q = q.filter(tuple_(*key_columns) > decode_cursor(cursor, sort))
+            # one extra row tells us whether there's another page
+            rows = q.limit(page_length + 1).all()
+            next_cursor = None
+            if len(rows) > page_length:
+                rows = rows[:page_length]
+                next_cursor = encode_cursor(rows[-1][-len(key_columns):], sort)
+            return {
+                'success': True,
+                'games': format_games(rows),
+                'next_cursor': next_cursor
+            }
 
         # @TODO check out Model.paginate
-        page = request.args.get('page', 1, type=int)
-        page_length = request.args.get("page_length", PAGE_LENGTH, type=int)
+        page = parse_page()
         offset = (page - 1) * page_length
-        # @TODO add order by number of players
-        q = Game.query.order_by(Game.start_time)
-        if offset > q.count():
+        if offset > filter_games(db.session.query(func.count(Game.id))).scalar():
             abort(404, description=f'Page number {page} is out of bounds')
-        games = q.limit(page_length).offset(offset)
-        formatted_games = [g.format() for g in games]
-        return jsonify({
+        rows = filter_games(game_query()).order_by(*key_columns).\
+            limit(page_length).offset(offset)
+        formatted_games = format_games(rows)
+        return {
             'success': True,
             'games': formatted_games
-        })
+        }
+
+    @app.route('/games/export', methods=['GET'])
+    def export():
+        # every game as NDJSON, for the warehouse sync.
+        # ?include=registrations&updated_since=<iso 8601>
+        include_registrations = request.args.get('include') == 'registrations'
+        updated_since = parse_time_arg('updated_since')
+
+        def generate():
+            try:
+                yield from export_games(include_registrations, updated_since)
+            finally:
+                close_session()
+
+        return Response(stream_with_context(generate()),
+                        mimetype='application/x-ndjson')
+
+    @app.route('/games/players', methods=['GET'])
+    @cached_json(lambda: [f'game:{i}' for i in parse_ids_arg('ids')] + ['players'])
+    @replica_read
+    def rosters():
+        # rosters for ?ids=1,2,3 keyed by game id.  Ids that aren't games
+        # come back in not_found.
+        game_ids = parse_ids_arg('ids')
+        rosters = load_rosters(game_ids)
+        return {
+            'success': True,
+            'players': {str(game_id): roster for game_id, roster in rosters.items()},
+            'not_found': [i for i in game_ids if i not in rosters]
+        }
 
     @app.route('/game<int:game_id>/players')
+    @cached_json(lambda game_id: [f'game:{game_id}', 'players'])
+    @replica_read
     def players(game_id):
         # return the players in a game
-        if Game.query.get(game_id) is None:
+        if not db.session.query(Game.query.filter(Game.id == game_id).exists()).scalar():
             abort(404, description=f'Game id {game_id} not found.')
-        players = Player.query.\
+        players = db.session.query(*PLAYER_COLUMNS).\
                          join(Registration).\
-                         filter(Registration.game_id==game_id)
-        formatted_players = [p.format() for p in players]
-        return jsonify({
+                         filter(Registration.game_id==game_id).\
+                         order_by(Registration.id)
+        formatted_players = [format_player_row(p) for p in players]
+        return {
             'success': True,
             'players': formatted_players
-            })
+            }
 
     @app.route('/host/register', methods=['POST'])
     @requires_auth('create:game')
@@ -79,14 +322,12 @@ def register_views(app):
 
         error = False
         try:
-            host = Host(id=host_id, **column_vals)
-            host.add()
+            with unit_of_work():
+                host = Host(id=host_id, **column_vals)
+                host.add(commit=False)
         except Exception:
             error = True
-            rollback()
             print(sys.exc_info())
-        finally:
-            close_session()
 
         if error:
             # @TODO maybe that's the message.  check the exceptions
@@ -109,14 +350,12 @@ def register_views(app):
 
         error = False
         try:
-            host.update(updates)
+            with unit_of_work():
+                host.update(updates, commit=False)
             formatted_host = host.format()
         except Exception:
             error = True
-            rollback()
             print(sys.exc_info())
-        finally:
-            close_session()
 
         if error:
             # @TODO maybe that's the message.  check the exceptions
@@ -142,14 +381,12 @@ def register_views(app):
 
         error = False
         try:
-            player = Player(id=player_id, **column_vals)
-            player.add()
+            with unit_of_work():
+                player = Player(id=player_id, **column_vals)
+                player.add(commit=False)
         except Exception:
             error = True
-            rollback()
             print(sys.exc_info())
-        finally:
-            close_session()
 
         if error:
             # @TODO maybe that's the message.  check the exceptions
@@ -172,19 +409,18 @@ def register_views(app):
 
         error = False
         try:
-            player.update(updates)
+            with unit_of_work():
+                player.update(updates, commit=False)
             formatted_player = player.format()
         except Exception:
             error = True
-            rollback()
             print(sys.exc_info())
-        finally:
-            close_session()
 
         if error:
             # @TODO maybe that's the message.  check the exceptions
             abort(422, description='Invalid data')
 
+        invalidate('players')
         return jsonify({
             'success': True,
             'player': formatted_player
@@ -206,19 +442,18 @@ def register_views(app):
         error = False
 
         try:
-            game = Game(host_id=host_id, **column_vals)
-            game.add()
+            with unit_of_work():
+                game = Game(host_id=host_id, **column_vals)
+                game.add(commit=False)
         except Exception:
             error = True
-            rollback()
             print(sys.exc_info())
-        finally:
-            close_session()
 
         if error:
             # @TODO maybe that's the message.  check the exceptions
             abort(422, description='Invalid data')
 
+        invalidate('games')
         return jsonify({
             'success': True,
             'game': column_vals
@@ -231,35 +466,33 @@ def register_views(app):
 
         player_id = get_id(jwt_payload)
 
-        game = Game.query.get(game_id)
-        if game is None:
-            abort(404, description=f"Game {game_id} not found.")
-        if game.num_registered >= game.max_players:
-            abort(422, description=f'Game {game_id} is full.')
-        if Registration.query.filter(
-                Registration.game_id == game_id,
-                Registration.player_id == player_id
-                ).one_or_none():
-            abort(422, description=f"Player already registered for game {game_id}")
-        game.num_registered += 1
-        formatted_game = game.format()
-
         error = False
         try:
-            reg = Registration(player_id=player_id, game_id=game_id)
-            #this commits the game as well
-            reg.add()
+            with unit_of_work():
+                game = reserve_seat(game_id, player_id)
+        except IntegrityError:
+            error = True
+            already = Registration.query.filter_by(
+                game_id=game_id, player_id=player_id).first() is not None
         except Exception:
             error = True
-            rollback()
+            already = False
             print(sys.exc_info())
-        finally:
-            close_session()
+
         if error:
+            if already:
+                abort(422, description=f"Player already registered for game {game_id}")
             # This might happen if player_id isn't a real player
-            # or ???
-            abort(422)
+            abort(422, description='Invalid data')
+        if game is None:
+            # only now do we care which
+            if Game.query.get(game_id) is None:
+                abort(404, description=f"Game {game_id} not found.")
+            abort(422, description=f'Game {game_id} is full.')
+        formatted_game = game.format()
 
+        invalidate('games', f'game:{game_id}')
+        announce('seats', {'game': formatted_game, 'delta': 1})
         return jsonify({
             'success': True,
             'game': formatted_game
@@ -275,8 +508,11 @@ def register_views(app):
             abort(404, description=f'Game {game_id} not found.')
         if game.host_id != host_id:
             abort(403, description="Cannot delete someone else's game")
-        game.delete()
+        with unit_of_work():
+            game.delete(commit=False)
 
+        invalidate('games', f'game:{game_id}')
+        announce('deleted', {'id': game_id})
         return jsonify({
             'success': True,
             'game_id': game_id
@@ -298,20 +534,20 @@ def register_views(app):
 
         error = False
         try:
-            game.update(updates)
+            with unit_of_work():
+                game.update(updates, commit=False)
             # format may not work before commit because of string/datetime coersion
             formatted_game = game.format()
         except Exception:
             error = True
-            rollback()
             print(sys.exc_info())
-        finally:
-            close_session()
 
         if error:
             # @TODO maybe that's the message.  check the exceptions
             abort(422, description='Invalid data')
 
+        invalidate('games', f'game:{game_id}')
+        announce('seats', {'game': formatted_game, 'delta': 0})
         return jsonify({
             'success': True,
             'game': formatted_game
@@ -323,16 +559,22 @@ def register_views(app):
 
         player_id = get_id(jwt_payload)
 
-        reg = Registration.query.filter_by(game_id=game_id, player_id=player_id).one_or_none()
-        if reg is None:
+        error = False
+        try:
+            with unit_of_work():
+                game = release_seat(game_id, player_id)
+        except Exception:
+            error = True
+            print(sys.exc_info())
+
+        if error:
+            abort(422, description='Invalid data')
+        if game is None:
             abort(404, description=f'Player not registered for game {game_id}')
-        game = Game.query.get(game_id)
-        game.num_registered -= 1
-        #this commits
-        reg.delete()
         formatted_game = game.format()
-        close_session()
 
+        invalidate('games', f'game:{game_id}')
+        announce('seats', {'game': formatted_game, 'delta': -1})
         return jsonify({
             'success': True,
             'game': formatted_game
@@ -0,0 +1,254 @@
+import os
+import queue
+import sys
+import threading
+import time
+from flask import Response, json
+from .settings import setting, OFF, ON
+
+# Live seat counts for the games page, pushed over Server-Sent Events so
+# browsers don't have to poll /games.
+#
+#   GET /games/events    text/event-stream
+#
+# The write views publish once their commit is done:
+#
+#   event: seats       join, unregister and edit.  The game as /games
+#   data: {"game": {...}, "delta": 1}    formats it, and the change
+#                                        to num_registered
+#
+#   event: deleted
+#   data: {"id": 3}
+#
+# A Broker hands each message to every stream open in this process, and
+# its backend carries messages between processes:
+#
+#   'memory'    this process only, fine for a single worker
+#   'local'     the redis stand in (cache.LocalRedis), same code path as
+#               redis but still one process
+#   redis url   every worker hears every worker's writes
+#
+# SEAT_EVENTS picks one, or is an on/off flag: 0 turns the stream off,
+# 1 turns it on over RESPONSE_CACHE's redis if it has one, otherwise
+# 'memory'.  Each open stream holds a connection for as long as the page
+# is open, which pins a sync worker until gunicorn's timeout kills it, so
+# left unset the stream is only on with gevent workers (see
+# gunicorn.conf.py).  The games page only opens a stream when /home says
+# there is one.
+
+# messages a stream can fall behind by before it's cut off
+SEAT_EVENTS_QUEUE = 100
+# seconds between keepalive comments on a quiet stream
+SEAT_EVENTS_KEEPALIVE = 15
+# how long the browser waits before reconnecting, in ms
+RETRY_MS = 3000
+
+
+class MemoryBackend:
+    """Straight to this process's subscribers."""
+
+    def listen(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, message):
+        self._deliver(message)
+
+
+class RedisBackend:
+    """Through redis pub/sub, so every worker's broker gets every message,
+    its own included."""
+
+    def __init__(self, client, channel='pokester:seats'):
+        self.client = client
+        self.channel = channel
+
+    @classmethod
+    def from_url(cls, url):
+        # optional dependency, only needed if you ask for it
+        import redis
+        return cls(redis.from_url(url))
+
+    def listen(self, deliver):
+        def run():
+            while True:
+                try:
+                    pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self.channel)
+                    for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            deliver(message['data'].decode())
+                except Exception:
+                    # lost redis.  Streams go quiet until it's back, and
+                    # browsers refetch when they reconnect anyway
+                    time.sleep(1)
+        threading.Thread(target=run, name='seat-events', daemon=True).start()
+
+    def publish(self, message):
+        self.client.publish(self.channel, message)
+
+
+REDIS_SCHEMES = ('redis://', 'rediss://', 'unix://')
+
+
+def make_backend(spec):
+    if spec == 'memory':
+        return MemoryBackend()
+    if spec == 'local':
+        from .cache import LocalRedis
+        return RedisBackend(LocalRedis())
+    if spec.startswith(REDIS_SCHEMES):
+        return RedisBackend.from_url(spec)
+    raise ValueError(f'Unknown seat events backend {spec!r}')
+
+
+def gevent_workers():
+    # gunicorn.conf.py monkey patches before the app is loaded
+    if os.environ.get('GUNICORN_WORKER_CLASS') == 'gevent':
+        return True
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+
+def shared_backend(app):
+    # the response cache's redis, if it has one
+    cache = str(setting(app, 'RESPONSE_CACHE', ''))
+    return cache if cache.startswith(REDIS_SCHEMES) else 'memory'
+
+
+def default_backend(app):
+    return shared_backend(app) if gevent_workers() else None
+
+
+def backend_spec(app):
+    """What SEAT_EVENTS asks for, as a make_backend spec or None for off."""
+    value = setting(app, 'SEAT_EVENTS')
+    if value is None:
+        return default_backend(app)
+    if isinstance(value, bool):
+        return shared_backend(app) if value else None
+    value = str(value)
+    if value in ('memory', 'local') or value.startswith(REDIS_SCHEMES):
+        return value
+    if value.lower() in ON:
+        return shared_backend(app)
+    if value.lower() in OFF:
+        return None
+    raise ValueError(f'Unknown seat events backend {value!r}')
+
+
+class Subscription:
+
+    def __init__(self, size):
+        self.queue = queue.Queue(size)
+        # set when it fell too far behind and stopped getting messages
+        self.dropped = False
+
+
+class Broker:
+
+    def __init__(self, backend, queue_size=SEAT_EVENTS_QUEUE):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        # the process the backend is listening in.  Threads don't survive
+        # gunicorn's fork, so each worker starts its own on first use.
+        self._listening = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def publish(self, event, data):
+        self._listen()
+        self.backend.publish(json.dumps({'event': event, 'data': data}))
+        self.published += 1
+
+    def subscribe(self):
+        self._listen()
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def deliver(self, message):
+        """The backend calls this with every message published anywhere."""
+        message = json.loads(message)
+        text = f'event: {message["event"]}\ndata: {json.dumps(message["data"])}\n\n'
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(text)
+                self.delivered += 1
+            except queue.Full:
+                # can't keep up.  Cut it off, the browser reconnects and
+                # refetches instead of showing counts with gaps in them
+                self.unsubscribe(subscription)
+                subscription.dropped = True
+                self.dropped += 1
+
+    def stats(self):
+        with self._lock:
+            subscribers = len(self._subscribers)
+        return {
+            'subscribers': subscribers,
+            'published': self.published,
+            'delivered': self.delivered,
+            'dropped': self.dropped
+        }
+
+    def _listen(self):
+        pid = os.getpid()
+        if self._listening == pid:
+            return
+        with self._lock:
+            if self._listening != pid:
+                self._listening = pid
+                self.backend.listen(self.deliver)
+
+
+def stream(broker, subscription, keepalive=SEAT_EVENTS_KEEPALIVE):
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        while not subscription.dropped:
+            try:
+                yield subscription.queue.get(timeout=keepalive)
+            except queue.Empty:
+                # also how we find out the browser has gone
+                yield ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def setup_events(app):
+    spec = backend_spec(app)
+    if spec is None:
+        app.extensions['seat_events'] = None
+        return None
+    if not gevent_workers():
+        app.logger.warning('SEAT_EVENTS is on without gevent workers, so every '
+                           'open /games/events holds a worker')
+    elif spec == 'memory' and int(os.environ.get('WEB_CONCURRENCY') or 1) > 1:
+        app.logger.warning("SEAT_EVENTS=memory only reaches streams on the worker "
+                           "that made the change, use redis with several workers")
+    broker = Broker(make_backend(spec), queue_size=int(
+        setting(app, 'SEAT_EVENTS_QUEUE', SEAT_EVENTS_QUEUE)))
+    keepalive = float(setting(app, 'SEAT_EVENTS_KEEPALIVE', SEAT_EVENTS_KEEPALIVE))
+
+    @app.route('/games/events')
+    def game_events():
+        # subscribe now, not when the first chunk is pulled, so nothing
+        # published after this request arrived is missed
+        subscription = broker.subscribe()
+        return Response(stream(broker, subscription, keepalive),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache',
+                                 # tell nginx not to buffer it
+                                 'X-Accel-Buffering': 'no'})
+
+    app.extensions['seat_events'] = broker
+    return broker
@@ -0,0 +1,44 @@
+from flask import json
+from .models import db, Game, Registration
+from .reads import game_query, format_game_row
+
+# Rows are streamed off server side cursors in chunks of this many, so
+# memory use doesn't grow with the table.
+EXPORT_CHUNK = 1000
+
+
+def export_games(include_registrations=False, updated_since=None):
+    """Yield every game as a line of JSON, oldest id first.
+
+    With include_registrations each game carries the ids of its
+    registered players.  updated_since limits it to games changed since
+    then (joins and unregisters count as changes).  Deleted games just
+    stop showing up.
+    """
+    games = game_query(Game.updated_at).order_by(Game.id)
+    if updated_since is not None:
+        games = games.filter(Game.updated_at >= updated_since)
+
+    registrations = iter(())
+    if include_registrations:
+        # walked alongside the games, both ordered by game id, instead of
+        # one query per game
+        registrations = db.session.query(Registration.game_id, Registration.player_id).\
+            join(Game).order_by(Registration.game_id, Registration.id)
+        if updated_since is not None:
+            registrations = registrations.filter(Game.updated_at >= updated_since)
+        registrations = iter(registrations.yield_per(EXPORT_CHUNK))
+    pending = next(registrations, None)
+
+    for row in games.yield_per(EXPORT_CHUNK):
+        line = format_game_row(row)
+        line['updated_at'] = row.updated_at.isoformat()
+        if include_registrations:
+            game_id = line['id']
+            players = []
+            while pending is not None and pending[0] <= game_id:
+                if pending[0] == game_id:
+                    players.append(pending[1])
+                pending = next(registrations, None)
+            line['player_ids'] = players
+        yield json.dumps(line) + '\n'
@@ -0,0 +1,44 @@
+from flask.json import JSONEncoder
+from .settings import setting
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Flask 1.1 has no pluggable JSON provider, but jsonify and flask.json.dumps
+# end up calling json_encoder().encode(obj), so swapping the encoder class
+# swaps the serializer.
+#
+# JSON_BACKEND (app config or environment):
+#   'stdlib'  Flask's own encoder (default)
+#   'orjson'  orjson, if it's installed.  Otherwise we warn and use stdlib.
+#
+# orjson writes datetimes itself, as ISO 8601 rather than Flask's HTTP date
+# format.  None of the views return raw datetimes today.
+
+
+class OrjsonEncoder(JSONEncoder):
+
+    def encode(self, o):
+        option = 0
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.indent:
+            option |= orjson.OPT_INDENT_2
+        # self.default is Flask's fallback for whatever orjson doesn't know
+        return orjson.dumps(o, default=self.default, option=option).decode()
+
+
+def setup_json(app):
+    backend = str(setting(app, 'JSON_BACKEND', 'stdlib')).lower()
+    if backend == 'orjson':
+        if orjson is not None:
+            app.json_encoder = OrjsonEncoder
+        else:
+            app.logger.warning('JSON_BACKEND=orjson but orjson is not installed, '
+                               'using the stdlib encoder')
+            backend = 'stdlib'
+    elif backend != 'stdlib':
+        raise ValueError(f'Unknown JSON_BACKEND {backend!r}')
+    app.config['JSON_BACKEND'] = backend
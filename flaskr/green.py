@@ -0,0 +1,33 @@
+# Cooperative serving with gevent workers (GUNICORN_WORKER_CLASS=gevent,
+# see gunicorn.conf.py).  Each worker runs every request in a greenlet,
+# so a slow query or Auth0 fetch waits on its socket while the worker
+# serves other requests, instead of holding the whole worker.
+#
+# gevent is optional and only needed for this mode.  The stdlib has to be
+# monkey patched before flaskr is imported; this module covers psycopg2,
+# which talks to postgres in C, out of gevent's reach.
+
+
+def patch_psycopg():
+    """Have psycopg2 hand control back to gevent while a query runs."""
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return False
+    extensions.set_wait_callback(gevent_wait_callback)
+    return True
+
+
+def gevent_wait_callback(conn, timeout=None):
+    from psycopg2 import extensions, OperationalError
+    from gevent.socket import wait_read, wait_write
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f'Bad result from poll: {state!r}')
@@ -0,0 +1,143 @@
+import json
+import threading
+import time
+
+from six.moves.urllib.request import urlopen
+
+# how long a fetched key set is trusted before we go get a fresh one
+JWKS_TTL = 10 * 60
+# past the ttl we keep serving the old keys while a background refresh runs,
+# but only up to this much longer.  After that we block on the fetch.
+JWKS_MAX_STALE = 60 * 60
+# an unknown kid triggers a refetch (Auth0 may have rotated keys),
+# but never more often than this, so junk tokens can't hammer Auth0
+JWKS_MIN_REFETCH_INTERVAL = 30
+
+ALGORITHM = 'RS256'
+
+
+def fetch_jwks(url, timeout=5):
+    with urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def parse_jwks(jwks):
+    # returns {kid: key} with each key already parsed by the jose backend,
+    # so verification doesn't rebuild the RSA numbers on every request
+    from jose import jwk
+    keys = {}
+    for key in jwks.get('keys', []):
+        if key.get('kty') != 'RSA' or 'kid' not in key:
+            continue
+        if key.get('use', 'sig') != 'sig':
+            continue
+        try:
+            parsed = jwk.construct(key, ALGORITHM)
+        except Exception:
+            # one bad key shouldn't take the rest of the set down with it
+            continue
+        # both jose RSA backends take their native key type straight back
+        keys[key['kid']] = getattr(parsed, 'prepared_key', None) or parsed._prepared_key
+    return keys
+
+
+class JWKSStore:
+    """Auth0 signing keys indexed by kid.
+
+    Keys are fetched lazily, trusted for `ttl` seconds, then served stale
+    for up to `max_stale` more while a background thread refreshes them.
+    A kid we've never seen forces a refetch, rate limited by
+    `min_refetch_interval`.
+    """
+
+    def __init__(self, url, ttl=JWKS_TTL, max_stale=JWKS_MAX_STALE,
+                 min_refetch_interval=JWKS_MIN_REFETCH_INTERVAL,
+                 fetch=fetch_jwks, clock=time.monotonic):
+        self.url = url
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.min_refetch_interval = min_refetch_interval
+        self._fetch = fetch
+        self._clock = clock
+
+        self._keys = {}
+        self._fetched_at = None
+        self._last_attempt = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def get_key(self, kid):
+        """Return the parsed key for kid, or None if Auth0 doesn't have it."""
+        now = self._clock()
+        if self._fetched_at is None or now - self._fetched_at > self.ttl + self.max_stale:
+            # nothing usable cached, the caller has to wait
+            self.refresh(unless_fetched_since=now)
+        elif now - self._fetched_at > self.ttl:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is not None:
+            self.hits += 1
+            return key
+
+        self.misses += 1
+        if self._may_refetch():
+            self.refresh(unless_fetched_since=now)
+            key = self._keys.get(kid)
+        return key
+
+    def refresh(self, unless_fetched_since=None):
+        with self._lock:
+            # requests that queued up behind a fetch use its result
+            # instead of each fetching again in turn
+            if (unless_fetched_since is not None and self._fetched_at is not None and
+                    self._fetched_at >= unless_fetched_since):
+                return
+            self._last_attempt = self._clock()
+            try:
+                keys = parse_jwks(self._fetch(self.url))
+            except Exception:
+                self.refresh_errors += 1
+                if self._fetched_at is None:
+                    raise
+                # keep serving what we have; the next request will try again
+                return
+            self._keys = keys
+            self._fetched_at = self._clock()
+            self.refreshes += 1
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+            'keys': len(self._keys)
+        }
+
+    def _may_refetch(self):
+        if self._last_attempt is None:
+            return True
+        return self._clock() - self._last_attempt >= self.min_refetch_interval
+
+    def _refresh_in_background(self):
+        with self._lock:
+            # a failing Auth0 shouldn't get a new thread per request
+            if self._refreshing or not self._may_refetch():
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception:
+                pass
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
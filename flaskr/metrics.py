@@ -0,0 +1,218 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, request, has_request_context
+from sqlalchemy import event
+from .pool import pool_stats
+from .querylog import is_query
+from .settings import env_flag
+from . import auth
+
+# Prometheus metrics, served as text from /metrics.  Requests are timed
+# by before/after_request hooks and SQL by engine events, and everything
+# lands in a few dicts behind one lock, so it's cheap enough to leave on.
+# METRICS=0 (app config or environment) turns it off.
+#
+# Each worker process keeps its own numbers and /metrics reports the
+# worker that answered.  Prometheus sums them fine, as long as every
+# worker gets scraped often enough.
+#
+# Routes are labelled by their rule ('/game<int:game_id>/players'), not
+# the path, so the number of series stays fixed.
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# from pool_stats(), sqlite's pools only have some of them
+POOL_METRICS = [('checked_out', 'gauge'), ('idle', 'gauge'), ('overflow', 'gauge'),
+                ('checkouts', 'counter'), ('timeouts', 'counter'),
+                ('wait_seconds', 'counter')]
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help):
+        return self._add(Counter(name, help, self._lock))
+
+    def histogram(self, name, help, buckets):
+        return self._add(Histogram(name, help, buckets, self._lock))
+
+    def collector(self, collect):
+        """collect() returns (name, type, help, [(labels, value)]) tuples,
+        read at scrape time, for numbers something else already keeps."""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for metric in self._metrics:
+                metric.render(lines)
+        for collect in self._collectors:
+            for name, kind, help, samples in collect():
+                _header(lines, name, kind, help)
+                for labels, value in samples:
+                    lines.append(_sample(name, labels, value))
+        return '\n'.join(lines) + '\n'
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+class Counter:
+
+    def __init__(self, name, help, lock):
+        self.name = name
+        self.help = help
+        self._lock = lock
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, lines):
+        _header(lines, self.name, 'counter', self.help)
+        for labels, value in sorted(self._values.items()):
+            lines.append(_sample(self.name, labels, value))
+
+
+class Histogram:
+
+    def __init__(self, name, help, buckets, lock):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._lock = lock
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._values = {}
+
+    def observe(self, labels, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[i] += 1
+            counts[-1] += value
+
+    def render(self, lines):
+        _header(lines, self.name, 'histogram', self.help)
+        for labels, counts in sorted(self._values.items()):
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                total += count
+                lines.append(_sample(self.name + '_bucket', labels + (('le', bound),), total))
+            lines.append(_sample(self.name + '_sum', labels, counts[-1]))
+            lines.append(_sample(self.name + '_count', labels, total))
+
+
+def _header(lines, name, kind, help):
+    lines.append(f'# HELP {name} {help}')
+    lines.append(f'# TYPE {name} {kind}')
+
+
+def _sample(name, labels, value):
+    if labels:
+        pairs = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+        return f'{name}{{{pairs}}} {value}'
+    return f'{name} {value}'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def setup_metrics(app, engines):
+    # engines is {label: engine}, the primary and any replicas
+    if not env_flag(app, 'METRICS', True):
+        app.extensions['metrics'] = None
+        return None
+
+    registry = Registry()
+    requests = registry.counter(
+        'pokester_requests_total', 'Requests by route, method and status.')
+    latency = registry.histogram(
+        'pokester_request_duration_seconds', 'Time spent in the view.', LATENCY_BUCKETS)
+    statements = registry.histogram(
+        'pokester_sql_statements_per_request', 'SQL statements run by a request.',
+        STATEMENT_BUCKETS)
+    sql_time = registry.histogram(
+        'pokester_sql_duration_seconds_per_request', 'Time a request spent in SQL.',
+        LATENCY_BUCKETS)
+    auth_time = registry.histogram(
+        'pokester_auth_duration_seconds', 'Time verifying the bearer token.',
+        LATENCY_BUCKETS)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def record(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        route = (('route', _route()),)
+        labels = route + (('method', request.method),)
+        requests.inc(labels + (('status', response.status_code),))
+        latency.observe(labels, time.perf_counter() - start)
+        statements.observe(route, g.pop('sql_statements'))
+        sql_time.observe(route, g.pop('sql_seconds'))
+        if 'auth_seconds' in g:
+            auth_time.observe(route, g.pop('auth_seconds'))
+        return response
+
+    for engine in engines.values():
+        _count_sql(engine)
+
+    def pools():
+        stats = {name: pool_stats(engine) for name, engine in engines.items()}
+        for key, kind in POOL_METRICS:
+            samples = [((('engine', name),), values[key])
+                       for name, values in stats.items() if key in values]
+            if samples:
+                name = f'pokester_db_pool_{key}' + ('_total' if kind == 'counter' else '')
+                yield name, kind, f'Connection pool {key.replace("_", " ")}.', samples
+    registry.collector(pools)
+
+    def tokens():
+        stats = auth.token_cache.stats()
+        yield ('pokester_token_cache_hits_total', 'counter',
+               'Bearer tokens found already verified.', [((), stats['hits'])])
+        yield ('pokester_token_cache_misses_total', 'counter',
+               'Bearer tokens that needed verifying.', [((), stats['misses'])])
+        yield ('pokester_jwks_refreshes_total', 'counter',
+               'Auth0 key set fetches.', [((), auth.jwks_store.refreshes)])
+    registry.collector(tokens)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    app.extensions['metrics'] = registry
+    return registry
+
+
+def _count_sql(engine):
+    # the start time rides on the connection between the two events
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info['metrics_start'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'sql_statements' in g and is_query(statement):
+            g.sql_statements += 1
+            g.sql_seconds += time.perf_counter() - conn.info['metrics_start']
@@ -1,23 +1,70 @@
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import (Column, String, Integer, DateTime,
-                        CheckConstraint, ForeignKey)
+from contextlib import contextmanager
+from sqlalchemy import (Column, String, Integer, DateTime, event,
+                        CheckConstraint, ForeignKey, Index, UniqueConstraint)
+from .pool import engine_options, dispose_after_fork
+from .replicas import RoutingSQLAlchemy
+from .settings import env_flag
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 def setup_db(app, database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # pool settings, anything already in SQLALCHEMY_ENGINE_OPTIONS wins
+    options = engine_options(app, database_path)
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
     # let's see if it works without this line
     db.app = app
     db.init_app(app)
-    # this line will be used in case of a test db not set up in migrate
-    db.create_all()
+    dispose_after_fork(db.engine)
+    if db.engine.dialect.name == 'sqlite':
+        # sqlite ignores foreign keys, ON DELETE CASCADE included, unless
+        # every connection asks for them
+        event.listen(db.engine, 'connect', _sqlite_foreign_keys)
+    # this line will be used in case of a test db not set up in migrate.
+    # It checks every table on each boot, so production, where the
+    # migrations own the schema, turns it off with DB_CREATE_ALL=0 (see
+    # Deploying in the README for stamping a create_all database)
+    if env_flag(app, 'DB_CREATE_ALL', True):
+        db.create_all()
+
+
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
 
 
 def commit():
     db.session.commit()
 
+
+@contextmanager
+def unit_of_work():
+    """One transaction for everything inside: commits once when the block
+    ends, rolls back if it raises.  Either way the connection goes back to
+    the pool.  Nested blocks join the outer one.  Works as a decorator too:
+
+        with unit_of_work():
+            game.update(updates, commit=False)
+            Registration(...).add(commit=False)
+    """
+    session = db.session()
+    depth = session.info.get('unit_of_work', 0)
+    session.info['unit_of_work'] = depth + 1
+    try:
+        yield session
+        if depth == 0:
+            session.commit()
+    except BaseException:
+        if depth == 0:
+            session.rollback()
+        raise
+    finally:
+        session.info['unit_of_work'] = depth
+
 def rollback():
     db.session.rollback()
 
@@ -25,23 +72,66 @@ def close_session():
     db.session.close()
 
 
+# Seat bookkeeping is done in SQL so concurrent joins can't overfill a game:
+# the conditional UPDATE only takes a seat if one is free, and the
+# registration insert goes in the same transaction.  Call these inside a
+# unit_of_work().  Both return the updated game (detached, so it can still
+# be formatted after the commit), or None if nothing changed.
+
+def reserve_seat(game_id, player_id):
+    # IntegrityError means the player is already registered, or isn't a
+    # player
+    taken = Game.query.filter(Game.id == game_id,
+                              Game.num_registered < Game.max_players).\
+        update({Game.num_registered: Game.num_registered + 1},
+               synchronize_session=False)
+    if not taken:
+        return None
+    db.session.add(Registration(game_id=game_id, player_id=player_id))
+    return _current_game(game_id)
+
+
+def release_seat(game_id, player_id):
+    removed = Registration.query.filter_by(game_id=game_id, player_id=player_id).\
+        delete(synchronize_session=False)
+    if not removed:
+        return None
+    Game.query.filter(Game.id == game_id).\
+        update({Game.num_registered: Game.num_registered - 1},
+               synchronize_session=False)
+    return _current_game(game_id)
+
+
+def _current_game(game_id):
+    # populate_existing because the session may hold a pre-UPDATE copy.
+    # The autoflush sends any pending insert first.
+    game = Game.query.populate_existing().get(game_id)
+    db.session.expunge(game)
+    return game
+
+
 class BaseModel(db.Model):
     __abstract__ = True
 
-    def add(self):
+    # commit=False leaves the commit to an enclosing unit_of_work()
+
+    def add(self, commit=True):
         db.session.add(self)
-        db.session.commit()
+        if commit:
+            db.session.commit()
 
-    def delete(self):
+    def delete(self, commit=True):
         db.session.delete(self)
-        db.session.commit()
+        if commit:
+            db.session.commit()
 
-    def update(self, mapping=None, **kwargs):
+    def update(self, mapping=None, commit=True, **kwargs):
         if mapping is None:
             mapping = kwargs
         for k, v in mapping.items():
             setattr(self, k, v)
-        db.session.commit()
+        if commit:
+            db.session.commit()
 
 
 class Host(BaseModel):
@@ -51,9 +141,11 @@ class Host(BaseModel):
     name = Column(String(50), nullable=False)
     email = Column(String(50), nullable=False)
 
-    #without a host there is no game, thus 'delete-orphan'
+    #without a host there is no game, thus 'delete-orphan'.
+    #passive_deletes leaves the children to the database's ON DELETE CASCADE
+    #instead of loading them to delete one by one
     games = db.relationship('Game', backref='host', lazy=True,
-                            cascade='all, delete-orphan')
+                            cascade='all, delete-orphan', passive_deletes=True)
 
     def __repr__(self):
         return f'<Host {self.id} {self.name}>'
@@ -61,7 +153,11 @@ class Host(BaseModel):
 
 class Game(BaseModel):
     __tablename__ = 'game'
-    __table_args__ = (CheckConstraint('num_registered<=max_players'),)
+    __table_args__ = (
+        CheckConstraint('num_registered<=max_players'),
+        # /games sort order, and the keyset for cursor pagination
+        Index('ix_game_start_time_id', 'start_time', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     start_time = Column(DateTime, nullable=False)
@@ -71,10 +167,16 @@ class Game(BaseModel):
                          nullable=False)
     num_registered = Column(Integer, default=0, nullable=False)
     platform = Column(String(50), nullable=False)
-    host_id = Column(String, ForeignKey('host.id'), nullable=False)
+    host_id = Column(String, ForeignKey('host.id', ondelete='CASCADE'),
+                     nullable=False, index=True)
+    # bumped by any change to the row, seat counts included.  Drives
+    # incremental exports (/games/export?updated_since=)
+    updated_at = Column(DateTime, nullable=False, index=True,
+                        default=datetime.utcnow, onupdate=datetime.utcnow)
     #when deleteing the game, we want all entries in the registry to delete
     registrations = db.relationship('Registration', backref='game', lazy=True,
-                                    cascade='all, delete-orphan')
+                                    cascade='all, delete-orphan',
+                                    passive_deletes=True)
 
     def __repr__(self):
         return f'<Game {self.id}>'
@@ -89,6 +191,15 @@ class Game(BaseModel):
             'host_id': self.host_id
         }
 
+# indexes behind the /games filters and sorts
+Index('ix_game_platform_start_time', Game.platform, Game.start_time, Game.id)
+Index('ix_game_open_start_time', Game.start_time, Game.id,
+      postgresql_where=Game.num_registered < Game.max_players,
+      sqlite_where=Game.num_registered < Game.max_players)
+Index('ix_game_fill', Game.max_players - Game.num_registered,
+      Game.start_time, Game.id)
+
+
 class Player(BaseModel):
     __tablename__ = 'player'
 
@@ -96,7 +207,8 @@ class Player(BaseModel):
     name = Column(String(50), nullable=False)
     email = Column(String(50), nullable=False)
     registrations = db.relationship('Registration', backref='player', lazy=True,
-                                    cascade='all, delete-orphan')
+                                    cascade='all, delete-orphan',
+                                    passive_deletes=True)
 
     def __repr__(self):
         return f'<Player {self.id} {self.name}>'
@@ -112,10 +224,19 @@ class Player(BaseModel):
 #wherein we have lists of players registered for various games
 class Registration(BaseModel):
     __tablename__ = 'registration'
+    __table_args__ = (
+        # a player is in a game at most once.  The index also covers
+        # lookups by game_id alone (the /players join).
+        UniqueConstraint('game_id', 'player_id',
+                         name='uq_registration_game_player'),
+        Index('ix_registration_player_id', 'player_id'),
+    )
 
     id = Column(Integer, primary_key=True)
-    game_id = Column(Integer, ForeignKey('game.id'), nullable=False)
-    player_id = Column(String, ForeignKey('player.id'), nullable=False)
+    game_id = Column(Integer, ForeignKey('game.id', ondelete='CASCADE'),
+                     nullable=False)
+    player_id = Column(String, ForeignKey('player.id', ondelete='CASCADE'),
+                       nullable=False)
 
     def __repr__(self):
         return f'<Registry: game {self.game_id}, player {self.player_id}>'
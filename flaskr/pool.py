@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from sqlalchemy import exc
+from sqlalchemy.dialects.sqlite.pysqlite import SQLiteDialect_pysqlite
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+from .settings import env_flag, setting
+
+# Connection pool settings, from app config or the environment:
+#
+#   DB_POOL_SIZE      connections each process keeps open
+#   DB_MAX_OVERFLOW   extra connections under load, closed when returned
+#   DB_POOL_TIMEOUT   seconds to wait for a free connection before erroring
+#   DB_POOL_RECYCLE   seconds before a connection is replaced, keep it under
+#                     any server or proxy idle timeout
+#   DB_POOL_PRE_PING  test each connection on checkout (1/0)
+#
+# Every worker process has its own pool, so postgres can see up to
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections from us.  Keep that
+# under max_connections, less whatever else connects.
+
+POOL_DEFAULTS = {
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_PRE_PING': True,
+}
+
+
+def pool_settings(app):
+    settings = {}
+    for name, default in POOL_DEFAULTS.items():
+        if isinstance(default, bool):
+            settings[name] = env_flag(app, name, default)
+        else:
+            settings[name] = type(default)(setting(app, name, default))
+    return settings
+
+
+def engine_options(app, url):
+    """create_engine() keyword arguments for the pool settings."""
+    settings = pool_settings(app)
+    options = {
+        'pool_pre_ping': settings['DB_POOL_PRE_PING'],
+        'pool_recycle': settings['DB_POOL_RECYCLE'],
+    }
+    if not (url or 'sqlite').startswith('sqlite'):
+        # sqlite keeps flask-sqlalchemy's choice: a connection per checkout
+        # for files, one shared connection in memory
+        options.update(poolclass=MeteredQueuePool,
+                       pool_size=settings['DB_POOL_SIZE'],
+                       max_overflow=settings['DB_MAX_OVERFLOW'],
+                       pool_timeout=settings['DB_POOL_TIMEOUT'])
+    elif url and make_url(url).query.get('uri') in ('true', '1'):
+        # flask-sqlalchemy makes sqlite paths absolute, which turns a URI
+        # filename (file:name?mode=memory&cache=shared) into a file of
+        # that name, so connect with the URI ourselves
+        options['creator'] = _sqlite_uri_connect(make_url(url))
+    return options
+
+
+def _sqlite_uri_connect(url):
+    args, kwargs = SQLiteDialect_pysqlite().create_connect_args(url)
+    return lambda: sqlite3.connect(*args, **kwargs)
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that keeps track of how long checkouts wait.
+
+    The wait includes opening a new connection when the pool has to.  The
+    totals survive engine.dispose(), which swaps in a new pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._metrics_lock:
+                self.checkouts += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def recreate(self):
+        pool = super().recreate()
+        with self._metrics_lock:
+            pool.checkouts = self.checkouts
+            pool.timeouts = self.timeouts
+            pool.wait_seconds = self.wait_seconds
+            pool.max_wait_seconds = self.max_wait_seconds
+        return pool
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'idle': pool.checkedin(),
+            # negative until the pool has opened pool_size connections
+            'overflow': max(pool.overflow(), 0),
+        })
+    if isinstance(pool, MeteredQueuePool):
+        stats.update({
+            'checkouts': pool.checkouts,
+            'timeouts': pool.timeouts,
+            'wait_seconds': pool.wait_seconds,
+            'max_wait_seconds': pool.max_wait_seconds,
+        })
+    return stats
+
+
+# Engines whose pools are reset around fork().  gunicorn forks its workers
+# from a master that may already have connected (create_all, preload_app),
+# and a connection shared between processes corrupts both ends.  The
+# parent drops its idle connections before forking, and the child starts a
+# fresh pool so it never touches what it inherited.
+_engines = weakref.WeakSet()
+
+
+def dispose_after_fork(engine):
+    _engines.add(engine)
+
+
+def _dispose_engines():
+    for engine in list(_engines):
+        engine.dispose()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_dispose_engines, after_in_child=_dispose_engines)
@@ -0,0 +1,57 @@
+"""pytest plugin that holds endpoints to a SQL query budget.
+
+Loaded by the conftest.py at the repo root.  It turns on QUERY_DEBUG for
+every app the tests create, and a test marked with a budget fails if any
+request it makes runs more statements than its endpoint is allowed:
+
+    @pytest.mark.query_budget({'/games': 2, '/game<int:game_id>/players': 2})
+    def test_games(client):
+        ...
+
+Keys are route rules, and '*' covers any other route.  A bare number is
+the budget for every route.  Repeated statements (see querylog.py) fail
+the test too, unless the marker says allow_repeats=True.
+"""
+import os
+import pytest
+from . import querylog
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'query_budget(budget, allow_repeats=False): fail the test if '
+                   'a request runs more SQL statements than its route is allowed')
+    # before any test module builds its app
+    os.environ.setdefault('QUERY_DEBUG', '1')
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker('query_budget')
+    if marker is None:
+        yield
+        return
+
+    budget = marker.args[0] if marker.args else marker.kwargs['budget']
+    if not isinstance(budget, dict):
+        budget = {'*': budget}
+    allow_repeats = marker.kwargs.get('allow_repeats', False)
+
+    reports = []
+    querylog.listeners.append(reports.append)
+    try:
+        outcome = yield
+    finally:
+        querylog.listeners.remove(reports.append)
+    if outcome.excinfo is not None:
+        return
+
+    problems = []
+    for report in reports:
+        allowed = budget.get(report.route, budget.get('*'))
+        if allowed is not None and report.count > allowed:
+            problems.append(f'{report.count} queries, budget {allowed}: {report.describe()}')
+        elif report.repeated and not allow_repeats:
+            problems.append(f'repeated statements: {report.describe()}')
+    if problems:
+        pytest.fail('\n'.join(problems), pytrace=False)
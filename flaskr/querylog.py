@@ -0,0 +1,122 @@
+import time
+from collections import Counter
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from .settings import env_flag, setting
+
+# Development aid: record every SQL statement a request runs and point
+# out the usual suspects, the same statement run over and over (an N+1,
+# or a lookup done twice) and slow statements.  QUERY_DEBUG=1 (app config
+# or environment) turns it on; it's off by default.
+#
+# Every response then carries a summary header,
+#
+#   X-Query-Report: 2 queries; 1.3ms; 0 repeated; 0 slow
+#
+# and a request with repeats or slow statements is logged as a warning
+# with the statements themselves.  The query_budget pytest plugin
+# (flaskr/querybudget.py) checks the same reports.
+#
+# QUERY_REPEAT_THRESHOLD: runs of the same statement that count as a
+#                         repeat (default 2)
+# SLOW_QUERY_MS:          statements slower than this are slow (100)
+
+QUERY_REPEAT_THRESHOLD = 2
+SLOW_QUERY_MS = 100
+
+# called with every finished QueryReport, for the pytest plugin
+listeners = []
+
+# transaction bookkeeping rather than queries.  The app never sets
+# savepoints itself, only the test suite's rollback fixture does, and
+# counting them would make every budget depend on that
+TRANSACTION_CONTROL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def is_query(statement):
+    return not statement.lstrip().upper().startswith(TRANSACTION_CONTROL)
+
+
+class QueryReport:
+
+    def __init__(self, route, method, repeat_threshold=QUERY_REPEAT_THRESHOLD,
+                 slow_seconds=SLOW_QUERY_MS / 1000):
+        self.route = route
+        self.method = method
+        self.repeat_threshold = repeat_threshold
+        self.slow_seconds = slow_seconds
+        # (statement, seconds)
+        self.statements = []
+
+    def add(self, statement, seconds):
+        # bound parameters keep the values out, so the text is the shape
+        self.statements.append((' '.join(statement.split()), seconds))
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def seconds(self):
+        return sum(seconds for _, seconds in self.statements)
+
+    @property
+    def repeated(self):
+        """{statement: times run} for statements run repeat_threshold times or more."""
+        counts = Counter(statement for statement, _ in self.statements)
+        return {s: n for s, n in counts.items() if n >= self.repeat_threshold}
+
+    @property
+    def slow(self):
+        return [(s, seconds) for s, seconds in self.statements if seconds >= self.slow_seconds]
+
+    def summary(self):
+        return (f'{self.count} queries; {self.seconds * 1000:.1f}ms; '
+                f'{len(self.repeated)} repeated; {len(self.slow)} slow')
+
+    def describe(self):
+        lines = [f'{self.method} {self.route}: {self.summary()}']
+        lines += [f'  repeated x{n}: {s}' for s, n in self.repeated.items()]
+        lines += [f'  slow {seconds * 1000:.1f}ms: {s}' for s, seconds in self.slow]
+        return '\n'.join(lines)
+
+
+def setup_querylog(app, engines):
+    # engines is {label: engine}, the primary and any replicas
+    if not env_flag(app, 'QUERY_DEBUG'):
+        return False
+    repeat_threshold = int(setting(app, 'QUERY_REPEAT_THRESHOLD', QUERY_REPEAT_THRESHOLD))
+    slow_ms = float(setting(app, 'SLOW_QUERY_MS', SLOW_QUERY_MS))
+
+    @app.before_request
+    def start_report():
+        rule = request.url_rule
+        g.query_report = QueryReport(rule.rule if rule is not None else request.path,
+                                     request.method, repeat_threshold, slow_ms / 1000)
+
+    @app.after_request
+    def finish_report(response):
+        report = g.pop('query_report', None)
+        if report is None:
+            return response
+        response.headers['X-Query-Report'] = report.summary()
+        if report.repeated or report.slow:
+            app.logger.warning(report.describe())
+        for listener in listeners:
+            listener(report)
+        return response
+
+    for engine in engines.values():
+        _record(engine)
+    return True
+
+
+def _record(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info['querylog_start'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'query_report' in g and is_query(statement):
+            g.query_report.add(statement, time.perf_counter() - conn.info['querylog_start'])
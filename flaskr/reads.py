@@ -0,0 +1,50 @@
+from sqlalchemy import func
+from .models import db, Game, Player
+
+# Read only queries for the public endpoints.  They select just the columns
+# the JSON needs and build dicts straight from the rows, skipping ORM
+# instances and the identity map.  The dicts match Game.format() and
+# Player.format().
+
+
+def start_time_text():
+    # ctime() layout, e.g. 'Sat Oct  3 07:37:19 2026'.  On postgres the
+    # database renders it, so the driver hands back a str instead of
+    # building a datetime for every row.
+    if db.engine.dialect.name == 'postgresql':
+        return (func.to_char(Game.start_time, 'Dy Mon ') +
+                func.lpad(func.to_char(Game.start_time, 'FMDD'), 2) +
+                func.to_char(Game.start_time, ' HH24:MI:SS YYYY'))
+    return Game.start_time
+
+
+def game_query(*extra):
+    """Query for the columns of a formatted game, followed by `extra`."""
+    return db.session.query(Game.id, start_time_text(), Game.platform,
+                            Game.max_players, Game.num_registered, Game.host_id,
+                            *extra)
+
+
+def format_game_row(row):
+    start_time = row[1]
+    if not isinstance(start_time, str):
+        start_time = start_time.ctime()
+    return {
+        'id': row[0],
+        'start_time': start_time,
+        'platform': row[2],
+        'max_players': row[3],
+        'num_registered': row[4],
+        'host_id': row[5]
+    }
+
+
+PLAYER_COLUMNS = (Player.name, Player.email, Player.id)
+
+
+def format_player_row(row):
+    return {
+        'name': row[0],
+        'email': row[1],
+        'id': row[2]
+    }
@@ -0,0 +1,138 @@
+import threading
+import time
+from functools import wraps
+from flask import current_app
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, exc, orm
+from sqlalchemy.sql.dml import UpdateBase
+from .pool import engine_options, dispose_after_fork
+from .settings import setting
+
+# Read replicas for the read only views.  DATABASE_REPLICA_URLS (app config
+# or environment, comma separated) lists them.  Views marked @read_only
+# send their queries to one of them, round robin.  A replica that fails is
+# skipped for REPLICA_RETRY_AFTER seconds and the view is retried on the
+# next one, or on the primary when none are left.
+#
+# Everything else stays on the primary.  So does a read only view once its
+# session writes anything, so it reads its own writes.  Replication lag
+# still applies between requests: a client can write, then read from a
+# replica that hasn't caught up yet.
+
+REPLICA_RETRY_AFTER = 30
+
+
+class ReplicaSet:
+
+    def __init__(self, engines, retry_after=REPLICA_RETRY_AFTER, clock=time.monotonic):
+        self.engines = list(engines)
+        self.retry_after = retry_after
+        self._clock = clock
+        self._down = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.failovers = 0
+
+    def choose(self, exclude=()):
+        """Next healthy replica not in exclude, or None for the primary."""
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.engines)
+            for i in range(len(self.engines)):
+                engine = self.engines[(start + i) % len(self.engines)]
+                if engine not in exclude and self._healthy(engine):
+                    self.reads += 1
+                    return engine
+        return None
+
+    def mark_down(self, engine):
+        with self._lock:
+            self._down[engine] = self._clock()
+            self.failovers += 1
+
+    def stats(self):
+        with self._lock:
+            healthy = sum(self._healthy(engine) for engine in self.engines)
+        return {
+            'replicas': len(self.engines),
+            'healthy': healthy,
+            'reads': self.reads,
+            'failovers': self.failovers
+        }
+
+    def _healthy(self, engine):
+        # once retry_after is up a down replica gets another chance, and
+        # goes straight back down if it fails again
+        down_at = self._down.get(engine)
+        return down_at is None or self._clock() - down_at >= self.retry_after
+
+
+class RoutingSession(SignallingSession):
+    """Session that reads from session.info['replica'] when it's set."""
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = self.info.get('replica')
+        if (replica is not None and not self.info.get('wrote') and
+                not self._flushing and not isinstance(clause, UpdateBase)):
+            return replica
+        return super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _wrote(session, flush_context):
+    session.info['wrote'] = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def read_only(view):
+    """Run the view on a read replica, if there are any."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        replicas = current_app.extensions.get('replicas')
+        if not replicas:
+            return view(*args, **kwargs)
+        session = current_app.extensions['sqlalchemy'].db.session()
+        tried = []
+        while True:
+            replica = replicas.choose(exclude=tried)
+            session.info['replica'] = replica
+            try:
+                return view(*args, **kwargs)
+            except exc.OperationalError:
+                # reads are safe to repeat, so try somewhere else
+                if replica is None:
+                    raise
+                replicas.mark_down(replica)
+                tried.append(replica)
+                session.rollback()
+            finally:
+                session.info.pop('replica', None)
+    return wrapper
+
+
+def setup_replicas(app):
+    urls = setting(app, 'DATABASE_REPLICA_URLS', '')
+    if isinstance(urls, str):
+        urls = [url.strip() for url in urls.split(',') if url.strip()]
+    replicas = None
+    if urls:
+        engines = [create_engine(url, **engine_options(app, url)) for url in urls]
+        for engine in engines:
+            dispose_after_fork(engine)
+        replicas = ReplicaSet(engines, retry_after=float(
+            setting(app, 'REPLICA_RETRY_AFTER', REPLICA_RETRY_AFTER)))
+        app.teardown_request(_forget_writes)
+    app.extensions['replicas'] = replicas
+    return replicas
+
+
+def _forget_writes(exception):
+    # the session can outlive the request (a test holding an app context
+    # open), the next request starts with a clean slate
+    current_app.extensions['sqlalchemy'].db.session().info.pop('wrote', None)
@@ -0,0 +1,34 @@
+import os
+
+# Settings are read from the app config first, then the environment.
+#
+# Strings are stripped, and an empty one (METRICS=) is the same as not
+# setting it at all.  On/off flags all parse the same way: 0, false, no and
+# off (any case) are off, anything else is on.
+
+OFF = ('0', 'false', 'no', 'off')
+ON = ('1', 'true', 'yes', 'on')
+
+
+def setting(app, name, default=None):
+    value = app.config.get(name, os.environ.get(name))
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == '':
+        return default
+    return value
+
+
+def parse_flag(value, default=False):
+    if value is None:
+        return default
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if not value:
+            return default
+        return value not in OFF
+    return bool(value)
+
+
+def env_flag(app, name, default=False):
+    return parse_flag(setting(app, name), default)
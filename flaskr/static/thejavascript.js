@@ -109,16 +109,48 @@ const gameAttrs = [
 ];
 
 function addGamesRows(games) {
-    // games -> an array of game objects
+    // games -> an array of game objects.  Rows are built off the page and
+    // go in with one append, so a long page is one layout, not one a row.
     var table = document.getElementById('games-table');
+    const rows = document.createDocumentFragment();
     for (const game of games){
+        // pages can overlap if a start time moved under us
+        if (document.getElementById(`game${game.id}`)){
+            patchGameRow(game);
+            continue;
+        }
         var row = document.createElement('tr');
         row.id = `game${game.id}`;
         for (const [attr, cellBuilder] of gameAttrs){
             var cell = cellBuilder(game[attr], game);
             row.appendChild(cell);
         }
-        table.appendChild(row);
+        rows.appendChild(row);
+    }
+    table.appendChild(rows);
+}
+
+function patchGameRow(game){
+    // update a row already on the page in place, cell by cell, so
+    // nothing else in the table is rebuilt.  Games not shown are ignored.
+    const row = document.getElementById(`game${game.id}`);
+    if (!row){
+        return;
+    }
+    gameAttrs.forEach(([attr, cellBuilder], i) => {
+        // the players cell keeps its text on the button
+        const target = cellBuilder === playerCell ? row.cells[i].firstChild : row.cells[i];
+        const text = String(game[attr]);
+        if (target.textContent !== text){
+            target.textContent = text;
+        }
+    });
+}
+
+function removeGameRow(gameId){
+    const row = document.getElementById(`game${gameId}`);
+    if (row){
+        row.remove();
     }
 }
 
@@ -127,18 +159,296 @@ function addGamesRows(games) {
 
 // fetches---------------------------------------------------------
 
-function getGames(page, pageLength){
-    fetch(`/games?page=${page}&page_length=${pageLength}`)
-        .then(response => response.json())
-        .then(json => addGamesRows(json.games))
-        .catch(error => displayError(error));
+// Maps used as LRU caches: reading an entry moves it to the back, and
+// the front goes once there are more than `size`.
+function lruGet(map, key){
+    const value = map.get(key);
+    if (value !== undefined){
+        map.delete(key);
+        map.set(key, value);
+    }
+    return value;
+}
+
+function lruSet(map, key, value, size){
+    map.delete(key);
+    map.set(key, value);
+    while (map.size > size){
+        map.delete(map.keys().next().value);
+    }
+}
+
+function revalidate(url, cached){
+    // GET url, sending cached.etag back so an unchanged resource comes
+    // back as an empty 304.  Resolves to {etag, json}, cached itself on a
+    // 304.  Without RESPONSE_CACHE the server sends no ETags, and this is
+    // a plain GET.
+    const headers = {};
+    if (cached && cached.etag){
+        headers['If-None-Match'] = cached.etag;
+    }
+    // no-store so the browser hands us the 304 instead of handling it itself
+    return fetch(url, {headers: headers, cache: 'no-store'})
+        .then(response => {
+            if (response.status === 304 && cached && cached.etag){
+                return cached;
+            }
+            if (!response.ok){
+                // a 404 or 500 isn't data, and mustn't be kept as if it were
+                return response.json()
+                    .catch(() => ({}))
+                    .then(json => {
+                        throw new Error(json.description || `${url}: ${response.status}`);
+                    });
+            }
+            const etag = response.headers.get('ETag');
+            return response.json().then(json => ({etag: etag, json: json}));
+        });
+}
+
+// url -> {etag, json} for the most recent ETAG_CACHE_SIZE /games pages.
+// Rosters keep theirs in rosterCache instead.
+const ETAG_CACHE_SIZE = 50;
+const etagCache = new Map();
+
+function fetchJson(url){
+    return revalidate(url, lruGet(etagCache, url))
+        .then(entry => {
+            lruSet(etagCache, url, entry, ETAG_CACHE_SIZE);
+            return entry.json;
+        });
+}
+
+// Games are loaded a page at a time with /games' cursors as the table is
+// scrolled.  The next page is always fetched as soon as the last one is
+// shown, so by the time you reach the bottom it's usually already here.
+const GAMES_PAGE_LENGTH = 50;
+
+// every page shown, {url, ids}, and which page each game row came from,
+// for catching up after the seat stream reconnects
+const shownGamesPages = [];
+const rowPages = new Map();
+// the next page's {url, games promise}, or null once there are no more
+var nextGamesPage = {url: gamesUrl('')};
+var showingNextPage = false;
+
+function gamesUrl(cursor){
+    return `/games?cursor=${encodeURIComponent(cursor)}&page_length=${GAMES_PAGE_LENGTH}`;
+}
+
+function prefetchGames(){
+    // at most one request per page, however often we're asked
+    const page = nextGamesPage;
+    if (page && !page.json){
+        page.json = fetchJson(page.url);
+        page.json
+            .then(json => { page.games = json.games; })
+            // a failed fetch is retried next time we're asked
+            .catch(() => { page.json = null; });
+    }
+}
+
+function showMoreGames(){
+    const page = nextGamesPage;
+    if (!page || showingNextPage){
+        return;
+    }
+    showingNextPage = true;
+    prefetchGames();
+    page.json
+        .then(json => {
+            addGamesRows(json.games);
+            const shown = {url: page.url, ids: json.games.map(g => g.id)};
+            shownGamesPages.push(shown);
+            shown.ids.forEach(id => rowPages.set(`game${id}`, shown));
+            nextGamesPage = json.next_cursor ? {url: gamesUrl(json.next_cursor)} : null;
+            prefetchGames();
+            showingNextPage = false;
+            // a short page may not fill the screen
+            if (gamesBottomInView()){
+                showMoreGames();
+            }
+        })
+        .catch(error => {
+            showingNextPage = false;
+            displayError(error);
+        });
+}
+
+function patchPrefetchedGames(gameId, game){
+    // keep the page fetched but not yet shown up to date with the seat
+    // stream too.  No game means it was deleted.
+    const games = nextGamesPage && nextGamesPage.games;
+    const i = games ? games.findIndex(g => g.id === gameId) : -1;
+    if (i < 0){
+        return;
+    }
+    if (game){
+        games[i] = game;
+    }else{
+        games.splice(i, 1);
+    }
+}
+
+function gamesBottomInView(){
+    const more = document.getElementById('games-more');
+    const table = document.getElementById('games-table');
+    return !table.classList.contains('hidden') &&
+        more.getBoundingClientRect().top < window.innerHeight + 800;
+}
+
+function scrollGames(){
+    // start showing the next page a screenful or so before the bottom
+    const more = document.getElementById('games-more');
+    if (window.IntersectionObserver){
+        new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting) && gamesBottomInView()){
+                showMoreGames();
+            }
+        }, {rootMargin: '800px'}).observe(more);
+    }else{
+        window.addEventListener('scroll', () => {
+            if (gamesBottomInView()){
+                showMoreGames();
+            }
+        }, {passive: true});
+    }
+    showMoreGames();
+}
+
+// pages that may have missed seat events, refetched when next on screen
+const staleGamesPages = new Set();
+var staleGamesObserver = null;
+
+function refreshGamesPage(page){
+    staleGamesPages.delete(page);
+    for (const id of page.ids){
+        const row = document.getElementById(`game${id}`);
+        if (row && staleGamesObserver){
+            staleGamesObserver.unobserve(row);
+        }
+    }
+    fetchJson(page.url)
+        .then(json => json.games.forEach(patchGameRow))
+        .catch(error => console.log(error));
+}
+
+function markGamesStale(){
+    // after a reconnect anything shown could be out of date.  Only the
+    // pages on screen are refetched now, the rest when scrolled back to,
+    // so a reconnect costs a page or two, not everything ever shown.
+    if (!window.IntersectionObserver){
+        shownGamesPages.forEach(refreshGamesPage);
+        return;
+    }
+    if (!staleGamesObserver){
+        staleGamesObserver = new IntersectionObserver(entries => {
+            for (const entry of entries){
+                const page = entry.isIntersecting && rowPages.get(entry.target.id);
+                if (page && staleGamesPages.has(page)){
+                    refreshGamesPage(page);
+                }
+            }
+        });
+    }
+    for (const page of shownGamesPages){
+        staleGamesPages.add(page);
+        for (const id of page.ids){
+            const row = document.getElementById(`game${id}`);
+            if (row){
+                staleGamesObserver.observe(row);
+            }
+        }
+    }
+}
+
+function listenForSeats(){
+    // seat counts pushed by the server as players join and leave (see
+    // events.py), instead of polling /games.  The page only says where the
+    // stream is when the server has it turned on.
+    const url = document.getElementById('games-table').dataset.seatEvents;
+    if (!url || !window.EventSource){
+        return;
+    }
+    const source = new EventSource(url);
+    var connected = false;
+    source.onopen = function (){
+        if (connected){
+            revalidateRosters();
+            markGamesStale();
+        }
+        connected = true;
+    };
+    source.addEventListener('seats', event => {
+        const game = JSON.parse(event.data).game;
+        forgetRoster(game.id);
+        patchGameRow(game);
+        patchPrefetchedGames(game.id, game);
+    });
+    source.addEventListener('deleted', event => {
+        const gameId = JSON.parse(event.data).id;
+        forgetRoster(gameId);
+        removeGameRow(gameId);
+        patchPrefetchedGames(gameId, null);
+    });
+}
+
+// gameId -> {etag, json, checked} for the last ROSTER_CACHE_SIZE rosters
+// opened.  One reopened within ROSTER_FRESH_MS is shown as is, ETag or
+// not; after that it's fetched again, sending its ETag if it has one so
+// an unchanged roster is an empty 304.  The seat stream, when there is one, drops a game's roster as
+// soon as its seats change.
+const ROSTER_CACHE_SIZE = 200;
+const ROSTER_FRESH_MS = 10000;
+const rosterCache = new Map();
+// gameId -> the request in flight, so a roster is fetched once at a time
+const rosterRequests = new Map();
+
+function loadRoster(gameId){
+    const cached = lruGet(rosterCache, gameId);
+    if (cached && Date.now() - cached.checked < ROSTER_FRESH_MS){
+        return Promise.resolve(cached.json.players);
+    }
+    if (!rosterRequests.has(gameId)){
+        const request = revalidate(`/game${gameId}/players`, cached)
+            .then(entry => {
+                entry.checked = Date.now();
+                // unless the seat stream said it changed while we waited
+                if (rosterRequests.get(gameId) === request){
+                    lruSet(rosterCache, gameId, entry, ROSTER_CACHE_SIZE);
+                }
+                return entry.json.players;
+            })
+            .catch(error => {
+                rosterCache.delete(gameId);
+                throw error;
+            })
+            .finally(() => {
+                if (rosterRequests.get(gameId) === request){
+                    rosterRequests.delete(gameId);
+                }
+            });
+        rosterRequests.set(gameId, request);
+    }
+    return rosterRequests.get(gameId);
+}
+
+function forgetRoster(gameId){
+    rosterCache.delete(gameId);
+    rosterRequests.delete(gameId);
+}
+
+function revalidateRosters(){
+    // keep them, but check each with the server before it's shown again
+    for (const entry of rosterCache.values()){
+        entry.checked = 0;
+    }
 }
 
 function getPlayers(gameId){
     //players: {"name": x, "email": y}
-    fetch(`/game${gameId}/players`)
-        .then(response => response.json())
-        .then(json => activatePlayersTable(json.players, gameId))
+    loadRoster(gameId)
+        .then(players => activatePlayersTable(players, gameId))
         .catch(error => displayError(error))
 }
 
@@ -171,7 +481,8 @@ function attemptLogin(){
 }
 
 window.onload = function () {
-    getGames(1, 10);
+    scrollGames();
+    listenForSeats();
     document.getElementById('logout').onclick = logout;
     attemptLogin();
     // document.getElementById("sick_button").onclick = function (){verifyToken(loadJwt())};
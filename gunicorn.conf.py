@@ -0,0 +1,21 @@
+import os
+
+# Build the app once in the master and fork the workers from it, so each
+# new worker starts without re-importing anything.  This is safe because
+# database pools are reset across fork (flaskr/pool.py) and each worker
+# fetches the Auth0 keys the first time it needs them.
+# GUNICORN_PRELOAD=0 turns it off.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# sync (the default) or gevent.  A sync worker serves one request at a
+# time; a gevent worker serves up to worker_connections at once, switching
+# whenever one waits on postgres or Auth0.  gevent must be installed.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+if worker_class == 'gevent':
+    # before the app (preload_app) or anything else makes a lock or socket
+    from gevent import monkey
+    monkey.patch_all()
+    from flaskr.green import patch_psycopg
+    patch_psycopg()
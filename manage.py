@@ -1,8 +1,11 @@
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
 
+import sys
+from datetime import datetime
 from flaskr import create_app
 from flaskr.models import db
+from flaskr.export import export_games
 
 app = create_app()
 migrate = Migrate(app, db)
@@ -11,5 +14,16 @@ manager = Manager(app)
 manager.add_command('db', MigrateCommand)
 
 
+@manager.option('-r', '--registrations', dest='registrations', action='store_true',
+                help='include the player ids registered for each game')
+@manager.option('-s', '--since', dest='since', default=None,
+                help='only games updated since this ISO 8601 time')
+def export(registrations=False, since=None):
+    """Write every game to stdout as NDJSON"""
+    updated_since = datetime.fromisoformat(since) if since else None
+    for line in export_games(registrations, updated_since):
+        sys.stdout.write(line)
+
+
 if __name__ == '__main__':
     manager.run()
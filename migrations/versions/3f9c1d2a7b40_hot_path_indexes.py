@@ -0,0 +1,88 @@
+"""indexes for the hot query paths
+
+Revision ID: 3f9c1d2a7b40
+Revises: b1e4a9d07c35
+Create Date: 2026-10-17 09:12:44.318502
+
+On postgres the indexes are built CONCURRENTLY, outside the migration
+transaction, so game and registration stay writable during the deploy.
+The unique constraint is attached to its concurrently built index
+afterwards, which only takes a brief lock.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c1d2a7b40'
+down_revision = 'b1e4a9d07c35'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_game_start_time_id', 'game', ['start_time', 'id']),
+    ('ix_game_host_id', 'game', ['host_id']),
+    ('ix_registration_player_id', 'registration', ['player_id']),
+]
+
+UNIQUE_NAME = 'uq_registration_game_player'
+
+
+def _is_postgres():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def _remove_duplicate_registrations():
+    # the old check-then-insert in join_game could race, and the unique
+    # index can't be built over duplicates.  Keep the first registration
+    # and recount the games that had extras.
+    bind = op.get_bind()
+    dupes = bind.execute(sa.text(
+        'SELECT game_id FROM registration '
+        'GROUP BY game_id, player_id HAVING COUNT(*) > 1')).fetchall()
+    if not dupes:
+        return
+    bind.execute(sa.text(
+        'DELETE FROM registration WHERE id NOT IN '
+        '(SELECT MIN(id) FROM registration GROUP BY game_id, player_id)'))
+    for (game_id,) in set(dupes):
+        bind.execute(sa.text(
+            'UPDATE game SET num_registered = '
+            '(SELECT COUNT(*) FROM registration WHERE game_id = :game_id) '
+            'WHERE id = :game_id'), game_id=game_id)
+
+
+def upgrade():
+    _remove_duplicate_registrations()
+
+    if not _is_postgres():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns)
+        with op.batch_alter_table('registration') as batch_op:
+            batch_op.create_unique_constraint(UNIQUE_NAME, ['game_id', 'player_id'])
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+        op.create_index(UNIQUE_NAME, 'registration', ['game_id', 'player_id'],
+                        unique=True, postgresql_concurrently=True)
+    op.execute(f'ALTER TABLE registration ADD CONSTRAINT {UNIQUE_NAME} '
+               f'UNIQUE USING INDEX {UNIQUE_NAME}')
+
+
+def downgrade():
+    if not _is_postgres():
+        with op.batch_alter_table('registration') as batch_op:
+            batch_op.drop_constraint(UNIQUE_NAME, type_='unique')
+        for name, table, columns in INDEXES:
+            op.drop_index(name, table_name=table)
+        return
+
+    # dropping the constraint takes its index with it
+    op.drop_constraint(UNIQUE_NAME, 'registration', type_='unique')
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,51 @@
+"""indexes for the /games filters and sorts
+
+Revision ID: 8a41e6c0d5f2
+Revises: 3f9c1d2a7b40
+Create Date: 2026-10-17 10:03:27.905116
+
+Built CONCURRENTLY on postgres, like the previous revision.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a41e6c0d5f2'
+down_revision = '3f9c1d2a7b40'
+branch_labels = None
+depends_on = None
+
+
+OPEN_SEATS = sa.text('num_registered < max_players')
+
+INDEXES = [
+    ('ix_game_platform_start_time', ['platform', 'start_time', 'id'], {}),
+    ('ix_game_open_start_time', ['start_time', 'id'],
+     {'postgresql_where': OPEN_SEATS, 'sqlite_where': OPEN_SEATS}),
+    ('ix_game_fill', [sa.text('(max_players - num_registered)'), 'start_time', 'id'], {}),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        for name, columns, kwargs in INDEXES:
+            op.create_index(name, 'game', columns, **kwargs)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, columns, kwargs in INDEXES:
+            op.create_index(name, 'game', columns,
+                            postgresql_concurrently=True, **kwargs)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        for name, columns, kwargs in INDEXES:
+            op.drop_index(name, table_name='game')
+        return
+
+    with op.get_context().autocommit_block():
+        for name, columns, kwargs in INDEXES:
+            op.drop_index(name, table_name='game', postgresql_concurrently=True)
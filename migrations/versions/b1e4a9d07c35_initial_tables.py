@@ -0,0 +1,67 @@
+"""the four tables, as create_all made them before any migrations
+
+Revision ID: b1e4a9d07c35
+Revises:
+Create Date: 2026-10-17 09:05:12.204117
+
+So `db upgrade` can build a database from nothing.  A database that
+create_all made before the migrations existed already has these, stamp it
+here instead: `python manage.py db stamp b1e4a9d07c35`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b1e4a9d07c35'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'host',
+        sa.Column('id', sa.String(length=40), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('email', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'player',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('email', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'game',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('max_players', sa.Integer(), nullable=False),
+        sa.Column('num_registered', sa.Integer(), nullable=False),
+        sa.Column('platform', sa.String(length=50), nullable=False),
+        sa.Column('host_id', sa.String(), nullable=False),
+        sa.CheckConstraint('num_registered<=max_players'),
+        sa.CheckConstraint('max_players<10'),
+        sa.CheckConstraint('max_players>1'),
+        sa.ForeignKeyConstraint(['host_id'], ['host.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'registration',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('game_id', sa.Integer(), nullable=False),
+        sa.Column('player_id', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['game_id'], ['game.id']),
+        sa.ForeignKeyConstraint(['player_id'], ['player.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('registration')
+    op.drop_table('game')
+    op.drop_table('player')
+    op.drop_table('host')
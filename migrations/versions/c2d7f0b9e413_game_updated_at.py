@@ -0,0 +1,76 @@
+"""game.updated_at for incremental exports
+
+Revision ID: c2d7f0b9e413
+Revises: 8a41e6c0d5f2
+Create Date: 2026-10-17 11:26:50.662019
+
+Existing rows get the migration time in UTC, since the model writes
+datetime.utcnow() and exports compare the two.  The server default is only
+there for that backfill and is dropped after, so the schema matches the
+model.  On postgres 11+ adding a column with a non-volatile default
+doesn't rewrite the table, and the index is built CONCURRENTLY.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d7f0b9e413'
+down_revision = '8a41e6c0d5f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        # sqlite can't ALTER in a column with a non-constant default,
+        # batch mode copies the table instead.  Its CURRENT_TIMESTAMP is
+        # already UTC
+        column = sa.Column('updated_at', sa.DateTime(), nullable=False,
+                           server_default=sa.func.current_timestamp())
+        with op.batch_alter_table('game', recreate='always',
+                                  table_args=_game_checks()) as batch_op:
+            batch_op.add_column(column)
+            batch_op.create_index('ix_game_updated_at', ['updated_at'])
+        with op.batch_alter_table('game', recreate='always',
+                                  table_args=_game_checks()) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(),
+                                  server_default=None)
+        _restore_sqlite_indexes()
+        return
+    # now() is the session's time zone, the model's timestamps are UTC
+    op.add_column('game', sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                    server_default=sa.text("timezone('utc', now())")))
+    op.alter_column('game', 'updated_at', server_default=None)
+    with op.get_context().autocommit_block():
+        op.create_index('ix_game_updated_at', 'game', ['updated_at'],
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index('ix_game_updated_at', table_name='game')
+    sqlite = op.get_bind().dialect.name != 'postgresql'
+    with op.batch_alter_table('game', table_args=_game_checks() if sqlite else ()) as batch_op:
+        batch_op.drop_column('updated_at')
+    if sqlite:
+        _restore_sqlite_indexes()
+
+
+# sqlite reflection doesn't see CHECK constraints either, so the copy
+# needs them handed over.  New objects each time, a constraint only
+# attaches to one table
+def _game_checks():
+    return (sa.CheckConstraint('num_registered<=max_players'),
+            sa.CheckConstraint('max_players<10'),
+            sa.CheckConstraint('max_players>1'))
+
+
+def _restore_sqlite_indexes():
+    # sqlite's reflection skips expression indexes and drops the WHERE off
+    # partial ones, so the batch table copy mangles these two
+    op.execute('DROP INDEX IF EXISTS ix_game_open_start_time')
+    op.create_index('ix_game_open_start_time', 'game', ['start_time', 'id'],
+                    sqlite_where=sa.text('num_registered < max_players'))
+    op.create_index('ix_game_fill', 'game',
+                    [sa.text('(max_players - num_registered)'), 'start_time', 'id'])
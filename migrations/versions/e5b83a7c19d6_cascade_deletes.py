@@ -0,0 +1,92 @@
+"""ON DELETE CASCADE for games and registrations
+
+Revision ID: e5b83a7c19d6
+Revises: c2d7f0b9e413
+Create Date: 2026-10-17 13:02:11.480276
+
+Deleting a host or game now takes one statement, with the database
+removing the children.  The models set passive_deletes so the ORM stops
+loading them first.
+
+On postgres each constraint is swapped in a single ALTER and added NOT
+VALID, so there's no table scan under the lock.  VALIDATE then checks the
+existing rows without blocking writes.  sqlite can't alter constraints,
+so batch mode copies the tables.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b83a7c19d6'
+down_revision = 'c2d7f0b9e413'
+branch_labels = None
+depends_on = None
+
+
+# (table, column, referred table).  create_all left these unnamed, so
+# postgres named them <table>_<column>_fkey
+FOREIGN_KEYS = [
+    ('game', 'host_id', 'host'),
+    ('registration', 'game_id', 'game'),
+    ('registration', 'player_id', 'player'),
+]
+
+# lets batch mode find sqlite's unnamed constraints by name
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def upgrade():
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(None)
+
+
+def _replace_foreign_keys(ondelete):
+    if op.get_bind().dialect.name != 'postgresql':
+        for table in ('game', 'registration'):
+            table_args = _game_checks() if table == 'game' else ()
+            with op.batch_alter_table(table, recreate='always',
+                                      naming_convention=NAMING_CONVENTION,
+                                      table_args=table_args) as batch_op:
+                for fk_table, column, referred in FOREIGN_KEYS:
+                    if fk_table != table:
+                        continue
+                    name = f'{table}_{column}_fkey'
+                    batch_op.drop_constraint(name, type_='foreignkey')
+                    batch_op.create_foreign_key(name, referred, [column], ['id'],
+                                                ondelete=ondelete)
+        _restore_sqlite_indexes()
+        return
+
+    action = f' ON DELETE {ondelete}' if ondelete else ''
+    for table, column, referred in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}, '
+                   f'ADD CONSTRAINT {name} FOREIGN KEY ({column}) '
+                   f'REFERENCES {referred} (id){action} NOT VALID')
+    with op.get_context().autocommit_block():
+        for table, column, referred in FOREIGN_KEYS:
+            op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}_fkey')
+
+
+# sqlite reflection doesn't see CHECK constraints either, so the copy
+# needs them handed over.  New objects each time, a constraint only
+# attaches to one table
+def _game_checks():
+    return (sa.CheckConstraint('num_registered<=max_players'),
+            sa.CheckConstraint('max_players<10'),
+            sa.CheckConstraint('max_players>1'))
+
+
+def _restore_sqlite_indexes():
+    # sqlite's reflection skips expression indexes and drops the WHERE off
+    # partial ones, so the batch table copy mangles these two
+    op.execute('DROP INDEX IF EXISTS ix_game_open_start_time')
+    op.create_index('ix_game_open_start_time', 'game', ['start_time', 'id'],
+                    sqlite_where=sa.text('num_registered < max_players'))
+    op.create_index('ix_game_fill', 'game',
+                    [sa.text('(max_players - num_registered)'), 'start_time', 'id'])
@@ -1,10 +1,28 @@
-import os
-from sys import argv
+import io
+import csv
+import sys
+import time
+import random
+import argparse
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, func, select, text
 from flaskr.models import Host, Game, Player, Registration
 
+# Fills a database with made up hosts, players, games and registrations.
+#
+#   populate_test_db.py <database url>
+#
+# writes the small fixture the tests expect (see do_it).  Any of the size
+# options switches to generated data at whatever scale you ask for,
+#
+#   populate_test_db.py <database url> --hosts 10000 --players 1000000 \
+#       --games 2000000 [--seed 0] [--chunk 10000]
+#
+# which is random but the same for the same seed.  Rows are streamed to
+# the database a chunk at a time, with COPY on postgres and executemany
+# inserts elsewhere, so memory stays flat however many you ask for.
+# Progress and rows/sec go to stderr.
+
 
 HOST_NAMES = [
     "Fred",
@@ -38,84 +56,222 @@ PLATFORMS = [
     "iwinyoulose.com"
 ]
 
+CHUNK = 10000
+# generated games start somewhere in the DAYS after START
+START = datetime(2030, 1, 1)
+DAYS = 365
+
+
+def host_id(i):
+    return f"auth0|host{i}"
+
+
+def player_id(i):
+    return f"auth0|player{i}"
+
+
+class Loader:
+    """Writes chunks of row dicts into tables on one connection and keeps
+    count for the progress line."""
+
+    def __init__(self, conn, out=sys.stderr):
+        self.conn = conn
+        self.out = out
+        self.copy = conn.dialect.name == 'postgresql' and conn.dialect.driver == 'psycopg2'
+        self.counts = {}
+        self.started = time.perf_counter()
+
+    @property
+    def rows(self):
+        return sum(self.counts.values())
+
+    @property
+    def rate(self):
+        return self.rows / max(time.perf_counter() - self.started, 1e-9)
+
+    def write(self, table, rows):
+        if not rows:
+            return
+        if self.copy:
+            self._copy(table, rows)
+        else:
+            self.conn.execute(table.insert(), rows)
+        self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+
+    def _copy(self, table, rows):
+        columns = list(rows[0])
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([row[c] for c in columns])
+        buf.seek(0)
+        cursor = self.conn.connection.cursor()
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+    def progress(self, label=''):
+        counts = '  '.join(f"{name} {n:,}" for name, n in self.counts.items())
+        print(f"{label}{counts}  ({self.rate:,.0f} rows/s)", file=self.out, flush=True)
+
+
+def _next_id(conn, table):
+    return (conn.execute(select([func.max(table.c.id)])).scalar() or 0) + 1
+
+
+def _sync_sequence(conn, table):
+    # games are written with their ids, so postgres' sequence hasn't moved
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"(SELECT max(id) FROM {table.name}))"))
+
+
+def people(make_id, kind, n):
+    for i in range(n):
+        yield {'id': make_id(i), 'name': f"{kind}{i}", 'email': f"{kind}{i}@example.com"}
+
+
+def games_and_registrations(rng, first_id, ngames, nhosts, nplayers, updated_at):
+    """Yields (game row, [registration rows]).  Each game seats a uniform
+    0 to max_players of distinct players, so num_registered <= max_players
+    holds by construction."""
+    for game_id in range(first_id, first_id + ngames):
+        max_players = rng.randint(2, 9)
+        seated = rng.sample(range(nplayers), rng.randint(0, min(max_players, nplayers)))
+        game = {
+            'id': game_id,
+            'start_time': START + timedelta(minutes=rng.randrange(DAYS * 24 * 60)),
+            'max_players': max_players,
+            'num_registered': len(seated),
+            'platform': rng.choice(PLATFORMS),
+            'host_id': host_id(rng.randrange(nhosts)),
+            'updated_at': updated_at
+        }
+        yield game, [{'game_id': game_id, 'player_id': player_id(p)} for p in seated]
+
+
+def chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def populate(engine, hosts, players, games, seed=0, chunk=CHUNK, out=sys.stderr):
+    """Generate `hosts`, `players` and `games` (with registrations) from
+    `seed` in one transaction.  Host and player ids are host_id(i) and
+    player_id(i); games are numbered on from any already there.  Returns
+    the Loader, for its counts and rate."""
+    if games and not (hosts and players):
+        raise ValueError("games need at least one host and one player")
+    rng = random.Random(seed)
+    updated_at = datetime.utcnow()
+    with engine.begin() as conn:
+        loader = Loader(conn, out)
+        for rows in chunks(people(host_id, 'host', hosts), chunk):
+            loader.write(Host.__table__, rows)
+        for rows in chunks(people(player_id, 'player', players), chunk):
+            loader.write(Player.__table__, rows)
+            loader.progress()
+
+        generated = games_and_registrations(
+            rng, _next_id(conn, Game.__table__), games, hosts, players, updated_at)
+        for pairs in chunks(generated, chunk):
+            loader.write(Game.__table__, [game for game, _ in pairs])
+            loader.write(Registration.__table__,
+                         [r for _, registrations in pairs for r in registrations])
+            loader.progress()
+        _sync_sequence(conn, Game.__table__)
+    loader.progress('done: ')
+    return loader
+
 
 def do_it(db_url, ngames=10):
+    # the fixture the tests are written against
     engine = create_engine(db_url, echo=False)
-    session = sessionmaker(bind=engine)()
 
     # get some fake auth0 ids ready
     ids = (f"auth0|{i}" for i in range(1000))
     # --------------------------------------------
     # add players and hosts
     players = [
-        Player(id=next(ids), name=name, email=f"{name}@gmail.com")
+        {'id': next(ids), 'name': name, 'email': f"{name}@gmail.com"}
         for name in PLAYER_NAMES
     ]
 
     hosts = [
-        Host(id=next(ids), name=name, email=f"{name}@gmail.com")
+        {'id': next(ids), 'name': name, 'email': f"{name}@gmail.com"}
         for name in HOST_NAMES
     ]
-
-    session.add_all(players)
-    session.add_all(hosts)
     # ---------------------------------------------
 
-    # ---------------------------------------------
-    # Add games, cycling through max players, hosts, platforms --
-    # new game every 8 hours.
-    now = datetime.now()
-    delta = timedelta(hours=+8)
-    maxes = [2, 6, 9]
-    host_ids = session.query(Host.id).all()
-    games = [
-        Game(start_time=now + (delta * i),
-             max_players=maxes[i % 3],
-             platform=PLATFORMS[i % len(PLATFORMS)],
-             host_id=host_ids[i % len(hosts)])
-        for i in range(ngames)
-    ]
+    with engine.begin() as conn:
+        loader = Loader(conn)
+        loader.write(Player.__table__, players)
+        loader.write(Host.__table__, hosts)
 
-    session.add_all(games)
-    # ---------------------------------------------
+        # ---------------------------------------------
+        # Add games, cycling through max players, hosts, platforms --
+        # new game every 8 hours.
+        now = datetime.now()
+        delta = timedelta(hours=+8)
+        maxes = [2, 6, 9]
+        first_id = _next_id(conn, Game.__table__)
+        games = [
+            {'id': first_id + i,
+             'start_time': now + (delta * i),
+             'max_players': maxes[i % 3],
+             'num_registered': 0,
+             'platform': PLATFORMS[i % len(PLATFORMS)],
+             'host_id': hosts[i % len(hosts)]['id'],
+             'updated_at': datetime.utcnow()}
+            for i in range(ngames)
+        ]
+        # ---------------------------------------------
 
-    # ---------------------------------------------
-    # Register players to games.
-    # Do one full game then
-    # continue registering max - 1 players to each game in
-    # succession until we run out of players.
-    player_ids = iter(session.query(Player.id).all())
-    game_columns = session.query(Game).all()
-    game = game_columns[0]
-    registrations = [
-        Registration(game_id=game.id, player_id=next(player_ids))
-        for _ in range(game.max_players)
-    ]
-    game.num_registered = game.max_players
-    session.add(game)
-    session.add_all(registrations)
-    for game in game_columns[1:]:
-        try:
-            registrations = [
-                Registration(game_id=game.id, player_id=next(player_ids))
-                for _ in range(game.max_players - 1)
-            ]
-        except StopIteration:
-            break
-        game.num_registered = game.max_players - 1
-        session.add(game)
-        session.add_all(registrations)
-    # ----------------------------------------------
-    session.commit()
+        # ---------------------------------------------
+        # Register players to games.
+        # Do one full game then
+        # continue registering max - 1 players to each game in
+        # succession until we run out of players.
+        player_ids = iter(p['id'] for p in players)
+        registrations = []
+        for i, game in enumerate(games):
+            seats = game['max_players'] - (1 if i else 0)
+            seated = [p for _, p in zip(range(seats), player_ids)]
+            if len(seated) < seats:
+                break
+            registrations += [{'game_id': game['id'], 'player_id': p} for p in seated]
+            game['num_registered'] = seats
+        # ----------------------------------------------
+        loader.write(Game.__table__, games)
+        loader.write(Registration.__table__, registrations)
+        _sync_sequence(conn, Game.__table__)
 
 
 def main():
-    if len(argv) < 2:
-        print ("Usage:  populate_test_db <database url>")
-        return 1
-    db_url = argv[1]
-    do_it(db_url)
+    parser = argparse.ArgumentParser(
+        description="Fill a database with test data.  With no sizes, the "
+                    "small fixture the tests use.")
+    parser.add_argument('db_url')
+    parser.add_argument('--hosts', type=int)
+    parser.add_argument('--players', type=int)
+    parser.add_argument('--games', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk', type=int, default=CHUNK,
+                        help=f"rows per round trip (default {CHUNK})")
+    args = parser.parse_args()
+
+    if args.hosts is None and args.players is None and args.games is None:
+        do_it(args.db_url)
+        return 0
+    populate(create_engine(args.db_url), args.hosts or 0, args.players or 0,
+             args.games or 0, args.seed, args.chunk)
     return 0
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import os
+from copy import copy
+import pytest
+from flask import _app_ctx_stack
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.engine.url import make_url
+from flaskr import create_app
+from flaskr.models import db
+from flaskr.replicas import RoutingSession
+from helpers import TEST_DB_URL, TEST_DB_NAME, TEST_DB_IN_MEMORY
+import populate_test_db
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database():
+    """This process's test database (one per xdist worker), made from
+    scratch and filled with the fixture data once per run."""
+    url = make_url(TEST_DB_URL)
+    keep_alive = admin = None
+    if TEST_DB_IN_MEMORY:
+        # the database lives as long as some connection to it does
+        keep_alive = create_engine(TEST_DB_URL).connect()
+    elif url.drivername.startswith('postgresql'):
+        admin_url = copy(url)
+        admin_url.database = 'postgres'
+        admin = create_engine(admin_url, isolation_level='AUTOCOMMIT')
+        _drop_postgres(admin)
+        admin.execute(f'CREATE DATABASE "{TEST_DB_NAME}"')
+    elif url.database and os.path.exists(url.database):
+        os.remove(url.database)
+
+    # making this throw away app creates the tables
+    create_app({'TESTING': True}, dburl=TEST_DB_URL)
+    populate_test_db.do_it(TEST_DB_URL)
+    yield TEST_DB_URL
+    if keep_alive is not None:
+        keep_alive.close()
+    if admin is not None:
+        _drop_postgres(admin)
+        admin.dispose()
+
+
+def _drop_postgres(admin):
+    # the apps' pools still hold connections to it
+    admin.execute('SELECT pg_terminate_backend(pid) FROM pg_stat_activity '
+                  'WHERE datname = %s AND pid <> pg_backend_pid()', TEST_DB_NAME)
+    admin.execute(f'DROP DATABASE IF EXISTS "{TEST_DB_NAME}"')
+
+
+class SavepointSession(RoutingSession):
+    """Session that keeps a SAVEPOINT open inside whatever transaction its
+    connection is already in, so commit() only releases the savepoint and
+    rollback() only goes back to it.  Either way another one starts."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.begin_nested()
+
+    def close(self):
+        # 1.3 closes a session without ending its savepoint on the
+        # connection, so roll it back first
+        self.info['closing'] = True
+        try:
+            if self.transaction is not None and self.transaction.nested:
+                self.rollback()
+            super().close()
+        finally:
+            self.info['closing'] = False
+        self.begin_nested()
+
+
+@event.listens_for(SavepointSession, 'after_transaction_end')
+def _restart_savepoint(session, transaction):
+    if (transaction.nested and not transaction._parent.nested
+            and not session.info.get('closing')):
+        session.expire_all()
+        session.begin_nested()
+
+
+@pytest.fixture
+def rollback(app):
+    """Run the test inside a transaction that's rolled back at the end.
+
+    db.session is swapped for SavepointSessions bound to one connection,
+    so the app's commits land in the transaction and the test sees its
+    own writes, and the next test sees none of them.  Everything has to
+    go through that one connection, so tests that hit the app from
+    several threads can't use this.
+    """
+    connection = db.get_engine(app).connect()
+    sqlite = connection.dialect.name == 'sqlite'
+    if sqlite:
+        # pysqlite only BEGINs before DML and a SAVEPOINT outside a
+        # transaction commits on release, so start it ourselves
+        isolation_level = connection.connection.isolation_level
+        connection.connection.isolation_level = None
+        connection.execute('BEGIN')
+    outer = connection.begin()
+
+    saved = db.session
+    factory = orm.sessionmaker(class_=SavepointSession, db=db, bind=connection, binds={})
+    db.session = orm.scoped_session(factory, scopefunc=_app_ctx_stack.__ident_func__)
+    try:
+        yield connection
+    finally:
+        db.session.remove()
+        db.session = saved
+        outer.rollback()
+        if sqlite:
+            connection.connection.isolation_level = isolation_level
+        connection.close()
@@ -1,9 +1,21 @@
 import os, sys
 
+# TEST_DB=memory runs the suite against an in memory sqlite database
+# instead of DATABASE_URL's server.  Under pytest-xdist every worker gets
+# its own database, named after the worker.
+TEST_DB_IN_MEMORY = os.environ.get('TEST_DB') == 'memory'
+
+
 def _test_db_url_and_name():
+    test_db_name = 'pokester__test__db'
+    worker = os.environ.get('PYTEST_XDIST_WORKER')
+    if worker:
+        test_db_name += '_' + worker
+    if TEST_DB_IN_MEMORY:
+        # shared cache, so every connection in the process sees the same one
+        return f'sqlite:///file:{test_db_name}?mode=memory&cache=shared&uri=true', test_db_name
     db_url = os.environ['DATABASE_URL']
     parts = db_url.split('/')
-    test_db_name = 'pokester__test__db'
     parts[-1] = test_db_name
     return '/'.join(parts), test_db_name
 
@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+# A stand in for Auth0's /.well-known/jwks.json so we can sign our own
+# tokens and count how often the app comes asking for keys.
+
+
+def make_key(kid):
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048,
+                                       backend=default_backend())
+    pem = private.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption())
+    public = jwk.construct(pem, 'RS256').public_key().to_dict()
+    # older jose hands back n and e as bytes
+    public = {k: v.decode() if isinstance(v, bytes) else v
+              for k, v in public.items()}
+    public.update({'kid': kid, 'use': 'sig'})
+    return pem, public
+
+
+def sign(pem, kid, issuer, audience, subject='auth0|test',
+         permissions=(), lifetime=3600):
+    now = int(time.time())
+    claims = {
+        'iss': issuer,
+        'aud': audience,
+        'sub': subject,
+        'iat': now,
+        'exp': now + lifetime,
+        'permissions': list(permissions)
+    }
+    return jwt.encode(claims, pem, algorithm='RS256', headers={'kid': kid})
+
+
+class JWKSServer:
+    def __init__(self):
+        self.keys = []
+        self.requests = 0
+        # seconds each response takes, to play a slow Auth0
+        self.delay = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(server.delay)
+                body = json.dumps({'keys': server.keys}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%d/.well-known/jwks.json' % self.httpd.server_port
+
+    def add_key(self, kid):
+        pem, public = make_key(kid)
+        self.keys.append(public)
+        return pem
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -23,15 +23,17 @@ import jwts
 #   3 |           9 |              8
 
 @pytest.fixture(scope='module')
-def client():
-    app = create_app({'TESTING': True}, dburl=TEST_DB_URL)
-    host_id = verify_decode_jwt(jwts.HOST)['sub']
-    player_id = verify_decode_jwt(jwts.PLAYER)['sub']
-    with app.app_context():
-        client = app.test_client()
-        client.host_id = host_id
-        client.player_id = player_id
-        return client
+def app():
+    return create_app({'TESTING': True}, dburl=TEST_DB_URL)
+
+
+# every test's writes are rolled back when it ends
+@pytest.fixture
+def client(app, rollback):
+    client = app.test_client()
+    client.host_id = verify_decode_jwt(jwts.HOST)['sub']
+    client.player_id = verify_decode_jwt(jwts.PLAYER)['sub']
+    return client
 
 
 def headers(token=None, json=False):
@@ -42,6 +44,16 @@ def headers(token=None, json=False):
         headers['Authorization'] = f'Bearer {token}'
     return headers
 
+@pytest.fixture
+def registered(client):
+    # the tokens' users, as test_register_host and test_register_player
+    # would leave them if their writes weren't rolled back
+    json = {'name': 'auth person', 'email': 'auth@auth.com'}
+    client.post('/host/register', headers=headers(jwts.HOST, json=True), json=json)
+    for token in (jwts.HOST, jwts.PLAYER):
+        client.post('/player/register', headers=headers(token, json=True), json=json)
+
+
 def test_register_host(client):
     # Hosts can register as hosts
     url = '/host/register'
@@ -93,7 +105,7 @@ def test_register_player(client):
                            json=json)
     assert response.status_code == 401
 
-def test_create_game(client):
+def test_create_game(client, registered):
     # Hosts can create games
     url = '/game/create'
     json = {'start_time':datetime.now() + timedelta(days=+3),
@@ -121,7 +133,7 @@ def test_create_game(client):
     assert response.status_code == 401
 
 
-def test_join_game(client):
+def test_join_game(client, registered):
     # Hosts and Players can join games
 
     url = '/game{}/join'
@@ -0,0 +1,154 @@
+import threading
+import time
+import pytest
+from flask import Flask
+from flaskr import create_app
+from flaskr.cache import (ResponseCache, MemoryBackend, RedisBackend,
+                          LocalRedis)
+from flaskr.models import Game, Player
+from helpers import TEST_DB_URL
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app({'TESTING': True, 'TEST_WITHOUT_AUTH': True,
+                      'RESPONSE_CACHE': 'local'}, dburl=TEST_DB_URL)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app, rollback):
+    client = app.test_client()
+    client.cache = app.extensions['response_cache']
+    # pages cached by an earlier test may hold its rolled back writes
+    client.cache.backend = RedisBackend(LocalRedis())
+    return client
+
+
+@pytest.fixture(params=['memory', 'local'])
+def cache(request):
+    backend = MemoryBackend() if request.param == 'memory' else RedisBackend(LocalRedis())
+    app = Flask(__name__)
+    with app.app_context():
+        yield ResponseCache(backend)
+
+
+def test_versions_invalidate(cache):
+    renders = []
+
+    def render():
+        renders.append(1)
+        return {'n': len(renders)}
+
+    for _ in range(3):
+        assert cache.json_response('k', ['games'], render).json == {'n': 1}
+    cache.bump('game:1')
+    assert cache.json_response('k', ['games'], render).json == {'n': 1}
+    cache.bump('games')
+    assert cache.json_response('k', ['games'], render).json == {'n': 2}
+    assert cache.stats()['hits'] == 3
+
+
+def test_single_flight(cache):
+    renders = []
+    app = Flask(__name__)
+
+    def render():
+        renders.append(1)
+        time.sleep(0.2)
+        return {'ok': True}
+
+    def get():
+        with app.app_context():
+            cache.json_response('slow', ['games'], render)
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(renders) == 1
+    assert cache.stats()['coalesced'] == 7
+
+
+def test_failed_render_not_cached(cache):
+    def render():
+        raise LookupError
+
+    with pytest.raises(LookupError):
+        cache.json_response('bad', ['games'], render)
+    assert cache.json_response('bad', ['games'], lambda: {}).json == {}
+
+
+def test_games_cache_invalidated_by_join(client):
+    player_id = Player.query.first().id
+    game = Game.query.filter_by(num_registered=0).first()
+    game_id, num_registered = game.id, game.num_registered
+
+    url = '/games?page_length=100'
+    before = client.get(url).json
+    hits = client.cache.stats()['hits']
+    assert client.get(url).json == before
+    assert client.cache.stats()['hits'] == hits + 1
+
+    players = client.get(f'/game{game_id}/players').json['players']
+    response = client.post(f'/game{game_id}/join?user_id={player_id}')
+    assert response.status_code == 200
+
+    after = {g['id']: g for g in client.get(url).json['games']}
+    assert after[game_id]['num_registered'] == num_registered + 1
+    new_players = client.get(f'/game{game_id}/players').json['players']
+    assert len(new_players) == len(players) + 1
+
+    # missing games aren't cached as anything
+    assert client.get('/game9999/players').status_code == 404
+    assert client.get('/game9999/players').status_code == 404
+
+
+def test_etag(client):
+    url = '/games?page_length=5'
+    response = client.get(url)
+    etag = response.headers['ETag']
+    assert etag
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    # a different page is a different resource
+    other = client.get('/games?page_length=6', headers={'If-None-Match': etag})
+    assert other.status_code == 200
+
+    # any write to games changes it
+    game = Game.query.filter_by(num_registered=0).first()
+    player_id = Player.query.first().id
+    client.post(f'/game{game.id}/join?user_id={player_id}')
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_bump_failure_does_not_fail_write(client, monkeypatch):
+    def down(names):
+        raise ConnectionError('redis is down')
+    monkeypatch.setattr(client.cache.backend, 'bump', down)
+    player_id = Player.query.first().id
+    game = Game.query.filter_by(num_registered=0).first()
+    response = client.post(f'/game{game.id}/join?user_id={player_id}')
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('value', ['0', ' off ', False, ''])
+def test_cache_off(value):
+    app = create_app({'TESTING': True, 'RESPONSE_CACHE': value}, dburl=TEST_DB_URL)
+    assert app.extensions['response_cache'] is None
+
+
+def test_cache_settings(monkeypatch):
+    monkeypatch.setenv('RESPONSE_CACHE_TTL', ' 60 ')
+    app = create_app({'TESTING': True, 'RESPONSE_CACHE': ' local '}, dburl=TEST_DB_URL)
+    cache = app.extensions['response_cache']
+    assert isinstance(cache.backend, RedisBackend)
+    assert cache.ttl == 60
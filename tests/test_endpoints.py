@@ -10,13 +10,17 @@ from helpers import TEST_DB_URL
 # response.status_code
 # response.json
 @pytest.fixture(scope='module')
-def client():
-    app = create_app({'TESTING': True, 'TEST_WITHOUT_AUTH': True}, dburl=TEST_DB_URL)
-    with app.app_context():
-        client = app.test_client()
-        return client
+def app():
+    return create_app({'TESTING': True, 'TEST_WITHOUT_AUTH': True}, dburl=TEST_DB_URL)
 
 
+# every test's writes are rolled back when it ends
+@pytest.fixture
+def client(app, rollback):
+    return app.test_client()
+
+
+@pytest.mark.query_budget({'/games': 2})
 def test_games(client):
     print (client.application.config["SQLALCHEMY_DATABASE_URI"])
     response = client.get('/games')
@@ -82,6 +86,7 @@ def test_create_game(client):
     assert response.status_code == 422
 
 
+@pytest.mark.query_budget({'/game<int:game_id>/join': 3, '*': 2})
 def test_join_game(client):
     # @TODO once i get jwts working i will get user id from there (i hope)
     player_id = Player.query.first().id
@@ -144,6 +149,17 @@ def test_delete_game(client):
     response = client.delete(f'/game{game.id}?user_id={host_id}')
     assert response.status_code == 403
 
+def test_delete_game_removes_registrations(client):
+    # the database cascades, nothing is loaded to delete row by row
+    game = Game.query.filter(Game.num_registered > 0).first()
+    game_id = game.id
+    assert Registration.query.filter_by(game_id=game_id).count()
+
+    response = client.delete(f'/game{game_id}?user_id={game.host_id}')
+    assert response.status_code == 200
+    assert Registration.query.filter_by(game_id=game_id).count() == 0
+
+
 def test_edit_game(client):
     # @TODO once i get jwts working i will get host id from there (i hope)
     host_id = Host.query.first().id
@@ -171,6 +187,7 @@ def test_edit_game(client):
     response = client.patch(url, json={'start_time': 'pretty soon'})
     assert response.status_code == 422
 
+@pytest.mark.query_budget({'/game<int:game_id>/unregister': 3, '*': 2})
 def test_unregister(client):
     # @TODO once i get jwts working i will get user id from there (i hope)
     player_id = Player.query.first().id
@@ -190,3 +207,129 @@ def test_unregister(client):
     # Now that the registration is gone, try it again
     response = client.delete(url)
     assert response.status_code == 404
+
+
+@pytest.mark.query_budget({'/games': 2})
+def test_games_cursor(client):
+    # walk every page by cursor and compare with the page/page_length view
+    seen = []
+    cursor = ''
+    while cursor is not None:
+        response = client.get(f'/games?page_length=3&cursor={cursor}')
+        assert response.status_code == 200
+        assert len(response.json['games']) <= 3
+        seen.extend(g['id'] for g in response.json['games'])
+        cursor = response.json['next_cursor']
+
+    assert len(seen) == len(set(seen)) == Game.query.count()
+    paged = client.get('/games?page_length=6').json['games']
+    assert seen[:6] == [g['id'] for g in paged]
+
+    response = client.get('/games?cursor=garbage')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('page', ['0', '-1', 'two'])
+def test_games_bad_page(client, page):
+    response = client.get(f'/games?page={page}')
+    assert response.status_code == 400
+    assert 'page' in response.json['description']
+
+
+@pytest.mark.parametrize('page_length', ['0', '-1', '101', 'ten'])
+def test_games_bad_page_length(client, page_length):
+    for query in (f'cursor=&page_length={page_length}', f'page_length={page_length}'):
+        response = client.get(f'/games?{query}')
+        assert response.status_code == 400
+        assert 'page_length' in response.json['description']
+
+
+def test_games_filters(client):
+    game = Game.query.first()
+    response = client.get(f'/games?page_length=100&platform={game.platform}')
+    assert response.status_code == 200
+    platforms = {g['platform'] for g in response.json['games']}
+    assert platforms == {game.platform}
+
+    response = client.get(f'/games?page_length=100&host_id={game.host_id}')
+    assert {g['host_id'] for g in response.json['games']} == {game.host_id}
+
+    response = client.get('/games?page_length=100&open_seats=true')
+    assert all(g['num_registered'] < g['max_players']
+               for g in response.json['games'])
+    assert len(response.json['games']) == Game.query.filter(
+        Game.num_registered < Game.max_players).count()
+
+    after = game.start_time.isoformat()
+    response = client.get(f'/games?page_length=100&start_after={after}')
+    assert game.id in [g['id'] for g in response.json['games']]
+    response = client.get(f'/games?page_length=100&start_before={after}')
+    assert game.id not in [g['id'] for g in response.json['games']]
+
+    response = client.get('/games?start_after=tomorrow')
+    assert response.status_code == 400
+    response = client.get('/games?sort=popularity')
+    assert response.status_code == 400
+
+
+def test_games_sort_fill(client):
+    response = client.get('/games?page_length=100&sort=fill')
+    assert response.status_code == 200
+    open_seats = [g['max_players'] - g['num_registered']
+                  for g in response.json['games']]
+    assert open_seats == sorted(open_seats)
+
+    # cursors follow the sort and can't be swapped between sorts
+    seen = []
+    cursor = ''
+    while cursor is not None:
+        response = client.get(f'/games?page_length=2&sort=fill&cursor={cursor}')
+        seen.extend(g['id'] for g in response.json['games'])
+        cursor = response.json['next_cursor']
+        if cursor:
+            mixed = client.get(f'/games?cursor={cursor}')
+            assert mixed.status_code == 400
+    assert seen == [g['id'] for g in client.get('/games?page_length=100&sort=fill').json['games']]
+
+
+def test_export(client):
+    import json
+    response = client.get('/games/export')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(l) for l in response.data.decode().splitlines()]
+    assert [g['id'] for g in lines] == sorted(g.id for g in Game.query)
+
+    response = client.get('/games/export?include=registrations')
+    lines = [json.loads(l) for l in response.data.decode().splitlines()]
+    for game in lines:
+        assert len(game['player_ids']) == game['num_registered']
+
+    newest = max(g['updated_at'] for g in lines)
+    response = client.get(f'/games/export?updated_since={newest}')
+    lines = [json.loads(l) for l in response.data.decode().splitlines()]
+    assert lines and all(g['updated_at'] >= newest for g in lines)
+
+    response = client.get('/games/export?updated_since=yesterday')
+    assert response.status_code == 400
+
+
+@pytest.mark.query_budget({'/games/players': 1, '/game<int:game_id>/players': 2,
+                           '/games': 3})
+def test_rosters(client):
+    games = Game.query.order_by(Game.id).limit(4).all()
+    ids = [g.id for g in games]
+    expected = {str(g.id): client.get(f'/game{g.id}/players').json['players']
+                for g in games}
+
+    response = client.get('/games/players?ids=' + ','.join(map(str, ids + [9999])))
+    assert response.status_code == 200
+    assert response.json['players'] == expected
+    assert response.json['not_found'] == [9999]
+
+    assert client.get('/games/players').status_code == 400
+    assert client.get('/games/players?ids=1,two').status_code == 400
+
+    response = client.get('/games?page_length=4&include=players')
+    for game in response.json['games']:
+        assert len(game['players']) == game['num_registered']
@@ -0,0 +1,158 @@
+import json
+import time
+import pytest
+from flaskr import create_app
+from flaskr.cache import LocalRedis
+from flaskr.events import (Broker, MemoryBackend, RedisBackend,
+                           backend_spec, default_backend)
+from flaskr.models import Game, Player
+from helpers import TEST_DB_URL
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app({'TESTING': True, 'TEST_WITHOUT_AUTH': True,
+                      'SEAT_EVENTS': 'local', 'SEAT_EVENTS_KEEPALIVE': 0.1},
+                     dburl=TEST_DB_URL)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app, rollback):
+    return app.test_client()
+
+
+@pytest.fixture(params=['memory', 'local'])
+def broker(request):
+    backend = MemoryBackend() if request.param == 'memory' else RedisBackend(LocalRedis())
+    return Broker(backend, queue_size=2)
+
+
+def test_fan_out(broker):
+    a, b = broker.subscribe(), broker.subscribe()
+    broker.publish('seats', {'game': {'id': 1}, 'delta': 1})
+    for subscription in (a, b):
+        text = subscription.queue.get(timeout=1)
+        assert text == 'event: seats\ndata: {"delta": 1, "game": {"id": 1}}\n\n'
+
+    broker.unsubscribe(b)
+    broker.publish('deleted', {'id': 1})
+    assert a.queue.get(timeout=1).startswith('event: deleted\n')
+    assert b.queue.empty()
+
+
+def test_slow_subscriber_dropped(broker):
+    slow, fast = broker.subscribe(), broker.subscribe()
+    for i in range(3):
+        broker.publish('deleted', {'id': i})
+        fast.queue.get(timeout=1)
+    # the local backend delivers from its own thread
+    deadline = time.monotonic() + 1
+    while not slow.dropped and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert slow.dropped and not fast.dropped
+    assert broker.stats()['dropped'] == 1
+    assert broker.stats()['subscribers'] == 1
+
+
+def next_event(chunks):
+    for chunk in chunks:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith('event:'):
+            event, data = chunk.strip().split('\n')
+            return event[len('event: '):], json.loads(data[len('data: '):])
+
+
+def test_join_and_unregister_stream_seats(client):
+    player_id = Player.query.first().id
+    game = Game.query.filter_by(num_registered=0).first()
+    game_id = game.id
+
+    stream = client.get('/games/events', buffered=False)
+    assert stream.mimetype == 'text/event-stream'
+    assert stream.headers['Cache-Control'] == 'no-cache'
+    chunks = iter(stream.response)
+    assert next(chunks).startswith(b'retry: ')
+
+    assert client.post(f'/game{game_id}/join?user_id={player_id}').status_code == 200
+    event, data = next_event(chunks)
+    assert event == 'seats'
+    assert data['delta'] == 1
+    assert data['game']['id'] == game_id
+    assert data['game']['num_registered'] == 1
+
+    assert client.delete(f'/game{game_id}/unregister?user_id={player_id}').status_code == 200
+    event, data = next_event(chunks)
+    assert (event, data['delta'], data['game']['num_registered']) == ('seats', -1, 0)
+
+    # failed writes say nothing
+    client.delete(f'/game{game_id}/unregister?user_id={player_id}')
+    client.post(f'/game9999/join?user_id={player_id}')
+    assert next(chunks) == b': keepalive\n\n'
+
+    host_id = Game.query.get(game_id).host_id
+    assert client.delete(f'/game{game_id}?user_id={host_id}').status_code == 200
+    assert next_event(chunks) == ('deleted', {'id': game_id})
+
+    subscribers = client.application.extensions['seat_events'].stats()['subscribers']
+    stream.close()
+    assert client.application.extensions['seat_events'].stats()['subscribers'] == subscribers - 1
+
+
+def test_off_by_default_with_sync_workers(monkeypatch):
+    monkeypatch.delenv('SEAT_EVENTS', raising=False)
+    monkeypatch.delenv('GUNICORN_WORKER_CLASS', raising=False)
+    app = create_app({'TESTING': True}, dburl=TEST_DB_URL)
+    assert app.extensions['seat_events'] is None
+    client = app.test_client()
+    assert client.get('/games/events').status_code == 404
+    assert b'data-seat-events' not in client.get('/home').data
+
+
+def test_default_backend(monkeypatch):
+    app = create_app({'TESTING': True}, dburl=TEST_DB_URL)
+    monkeypatch.delenv('GUNICORN_WORKER_CLASS', raising=False)
+    assert default_backend(app) is None
+    monkeypatch.setenv('GUNICORN_WORKER_CLASS', 'gevent')
+    assert default_backend(app) == 'memory'
+    app.config['RESPONSE_CACHE'] = 'redis://cache:6379/0'
+    assert default_backend(app) == 'redis://cache:6379/0'
+
+
+def test_page_advertises_stream(client):
+    assert b'data-seat-events="/games/events"' in client.get('/home').data
+
+
+def test_publish_failure_does_not_fail_write(client, monkeypatch):
+    def down(message):
+        raise ConnectionError('redis is down')
+    broker = client.application.extensions['seat_events']
+    monkeypatch.setattr(broker.backend, 'publish', down)
+    player_id = Player.query.first().id
+    game = Game.query.filter_by(num_registered=0).first()
+    response = client.post(f'/game{game.id}/join?user_id={player_id}')
+    assert response.status_code == 200
+    assert response.json['game']['num_registered'] == 1
+
+
+@pytest.mark.parametrize('value', ['1', 'true', ' on ', True])
+def test_flag_turns_it_on(monkeypatch, value):
+    monkeypatch.delenv('SEAT_EVENTS', raising=False)
+    monkeypatch.delenv('GUNICORN_WORKER_CLASS', raising=False)
+    app = create_app({'TESTING': True, 'SEAT_EVENTS': value}, dburl=TEST_DB_URL)
+    assert isinstance(app.extensions['seat_events'].backend, MemoryBackend)
+    app.config['RESPONSE_CACHE'] = 'redis://cache:6379/0'
+    assert backend_spec(app) == 'redis://cache:6379/0'
+
+
+@pytest.mark.parametrize('value', ['0', 'off', False])
+def test_flag_turns_it_off(monkeypatch, value):
+    monkeypatch.setenv('GUNICORN_WORKER_CLASS', 'gevent')
+    app = create_app({'TESTING': True, 'SEAT_EVENTS': value}, dburl=TEST_DB_URL)
+    assert app.extensions['seat_events'] is None
+
+
+def test_unknown_backend(monkeypatch):
+    with pytest.raises(ValueError):
+        create_app({'TESTING': True, 'SEAT_EVENTS': 'rabbitmq://x'}, dburl=TEST_DB_URL)
@@ -0,0 +1,57 @@
+import pytest
+from flask import Flask, jsonify, json
+from flaskr import create_app, fastjson
+from flaskr.fastjson import setup_json, OrjsonEncoder
+from helpers import TEST_DB_URL
+
+
+def make_app(backend):
+    app = Flask(__name__)
+    app.config['JSON_BACKEND'] = backend
+    setup_json(app)
+    return app
+
+
+def test_orjson_matches_stdlib():
+    pytest.importorskip('orjson')
+    payload = {'success': True, 'games': [
+        {'id': i, 'start_time': 'Sat Oct 17 07:37:19 2026', 'platform': 'Poker.com',
+         'max_players': 6, 'num_registered': 2, 'host_id': 'auth0|1'}
+        for i in range(3)]}
+    fast, slow = make_app('orjson'), make_app('stdlib')
+    assert fast.json_encoder is OrjsonEncoder
+    with fast.app_context():
+        fast_body = jsonify(payload).get_data()
+    with slow.app_context():
+        slow_body = jsonify(payload).get_data()
+    assert json.loads(fast_body) == json.loads(slow_body)
+
+
+def test_falls_back_without_orjson(monkeypatch):
+    monkeypatch.setattr(fastjson, 'orjson', None)
+    app = make_app('orjson')
+    assert app.config['JSON_BACKEND'] == 'stdlib'
+    assert app.json_encoder is not OrjsonEncoder
+
+    with pytest.raises(ValueError):
+        make_app('simdjson')
+
+
+def test_backend_setting_is_normalized(monkeypatch):
+    monkeypatch.setattr(fastjson, 'orjson', None)
+    assert make_app(' stdlib ').config['JSON_BACKEND'] == 'stdlib'
+    assert make_app('').config['JSON_BACKEND'] == 'stdlib'
+    assert make_app(' ORJSON ').config['JSON_BACKEND'] == 'stdlib'
+
+
+def test_endpoints_with_orjson():
+    pytest.importorskip('orjson')
+    app = create_app({'TESTING': True, 'TEST_WITHOUT_AUTH': True,
+                      'JSON_BACKEND': 'orjson'}, dburl=TEST_DB_URL)
+    with app.app_context():
+        client = app.test_client()
+        response = client.get('/games?page_length=3')
+        assert response.status_code == 200
+        assert len(response.json['games']) == 3
+        # errors go through jsonify too
+        assert client.get('/game9999/players').json['code'] == 404
@@ -0,0 +1,183 @@
+import time
+import threading
+import pytest
+from flaskr import auth
+from flaskr.auth import verify_decode_jwt, AuthError, TokenCache
+from flaskr.jwks import JWKSStore, fetch_jwks
+from jwks_server import JWKSServer, sign
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def server():
+    server = JWKSServer().start()
+    yield server
+    server.stop()
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_keys_fetched_once(server):
+    server.add_key('one')
+    store = JWKSStore(server.url)
+    for _ in range(20):
+        assert store.get_key('one') is not None
+    assert server.requests == 1
+    assert store.stats()['hits'] == 20
+    assert store.stats()['refreshes'] == 1
+
+
+def test_stale_keys_refresh_in_background(server):
+    server.add_key('one')
+    clock = Clock()
+    store = JWKSStore(server.url, ttl=10, max_stale=100, clock=clock)
+    store.get_key('one')
+
+    # stale but within max_stale: served immediately, refreshed behind our back
+    clock.now += 50
+    assert store.get_key('one') is not None
+    assert wait_for(lambda: store.refreshes == 2)
+    assert server.requests == 2
+
+    # fresh again, no more fetching
+    store.get_key('one')
+    assert server.requests == 2
+
+    # too stale to serve, fetched in the foreground
+    clock.now += 500
+    assert store.get_key('one') is not None
+    assert store.refreshes == 3
+
+
+def test_concurrent_cold_fetches_coalesce(server):
+    server.add_key('one')
+    server.delay = 0.2
+    store = JWKSStore(server.url)
+    threads = [threading.Thread(target=store.get_key, args=('one',)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert server.requests == 1
+    assert store.stats()['hits'] == 8
+
+
+def test_unknown_kid_refetch_is_rate_limited(server):
+    server.add_key('one')
+    clock = Clock()
+    store = JWKSStore(server.url, min_refetch_interval=30, clock=clock)
+    store.get_key('one')
+
+    # rotated key shows up after the interval
+    server.add_key('two')
+    assert store.get_key('two') is None
+    assert server.requests == 1
+    clock.now += 31
+    assert store.get_key('two') is not None
+    assert server.requests == 2
+
+    # a stream of garbage kids costs at most one fetch per interval
+    for _ in range(10):
+        assert store.get_key('nope') is None
+    assert server.requests == 2
+    clock.now += 31
+    assert store.get_key('nope') is None
+    assert server.requests == 3
+    assert store.stats()['misses'] == 13
+
+
+def test_failed_refresh_keeps_old_keys(server):
+    server.add_key('one')
+    fetch = fetch_jwks
+    clock = Clock()
+
+    def flaky(url):
+        return fetch(url)
+
+    store = JWKSStore(server.url, ttl=10, max_stale=10, fetch=flaky, clock=clock)
+    store.get_key('one')
+
+    def down(url):
+        raise OSError('auth0 is down')
+
+    fetch = down
+    clock.now += 100
+    assert store.get_key('one') is not None
+    assert store.stats()['refresh_errors'] == 1
+
+
+def test_verify_decode_jwt(server, monkeypatch):
+    issuer = 'https://' + auth.AUTH0_DOMAIN + '/'
+    audience = 'https://pokester.test'
+    pem = server.add_key('one')
+    monkeypatch.setattr(auth, 'jwks_store', JWKSStore(server.url))
+    monkeypatch.setattr(auth, 'token_cache', TokenCache())
+    monkeypatch.setattr(auth, 'AUTH0_AUDIENCE', audience)
+
+    token = sign(pem, 'one', issuer, audience, permissions=['join:game'])
+    for _ in range(5):
+        assert verify_decode_jwt(token)['permissions'] == ['join:game']
+    assert server.requests == 1
+
+    expired = sign(pem, 'one', issuer, audience, lifetime=-60)
+    with pytest.raises(AuthError) as e:
+        verify_decode_jwt(expired)
+    assert e.value.error['code'] == 'token_expired'
+
+    unknown = sign(pem, 'two', issuer, audience)
+    with pytest.raises(AuthError) as e:
+        verify_decode_jwt(unknown)
+    assert e.value.error['description'] == 'Unable to find appropriate key'
+
+
+def test_token_cache_skips_verification(server, monkeypatch):
+    issuer = 'https://' + auth.AUTH0_DOMAIN + '/'
+    audience = 'https://pokester.test'
+    pem = server.add_key('one')
+    cache = TokenCache()
+    monkeypatch.setattr(auth, 'jwks_store', JWKSStore(server.url))
+    monkeypatch.setattr(auth, 'token_cache', cache)
+    monkeypatch.setattr(auth, 'AUTH0_AUDIENCE', audience)
+
+    token = sign(pem, 'one', issuer, audience, permissions=['join:game'])
+    for _ in range(5):
+        verify_decode_jwt(token)
+    assert cache.stats() == {'hits': 4, 'misses': 1, 'size': 1}
+    assert auth.jwks_store.stats()['hits'] == 1
+
+
+def test_token_cache_expiry_and_eviction():
+    clock = Clock()
+    cache = TokenCache(maxsize=2, clock=clock)
+    cache.put('a', {'exp': clock.now + 10})
+    cache.put('b', {'exp': clock.now + 100})
+    # no exp, never cached
+    cache.put('c', {})
+    assert cache.get('c') is None
+
+    clock.now += 10
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+
+    cache.put('d', {'exp': clock.now + 100})
+    cache.put('e', {'exp': clock.now + 100})
+    assert cache.get('b') is None
+    assert cache.stats()['size'] == 2
+
+    off = TokenCache(maxsize=0, clock=clock)
+    off.put('a', {'exp': clock.now + 10})
+    assert off.get('a') is None
@@ -0,0 +1,65 @@
+import re
+import pytest
+from flaskr import create_app
+from flaskr.models import Game
+from flaskr.metrics import Registry
+from helpers import TEST_DB_URL
+
+
+@pytest.fixture(scope='module')
+def client():
+    app = create_app({'TESTING': True, 'TEST_WITHOUT_AUTH': True}, dburl=TEST_DB_URL)
+    with app.app_context():
+        yield app.test_client()
+
+
+def sample(text, name, **labels):
+    # value of the one sample with exactly these labels
+    wanted = ','.join(f'{k}="{v}"' for k, v in labels.items())
+    pattern = re.escape(name + ('{' + wanted + '}' if wanted else '')) + r' (\S+)$'
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_histogram_rendering():
+    registry = Registry()
+    histogram = registry.histogram('h', 'help', (1, 5))
+    for value in (0.5, 2, 2, 10):
+        histogram.observe((('route', '/x'),), value)
+    text = registry.render()
+    assert '# TYPE h histogram' in text
+    assert sample(text, 'h_bucket', route='/x', le=1) == 1
+    assert sample(text, 'h_bucket', route='/x', le=5) == 3
+    assert sample(text, 'h_bucket', route='/x', le='+Inf') == 4
+    assert sample(text, 'h_sum', route='/x') == 14.5
+    assert sample(text, 'h_count', route='/x') == 4
+
+
+def test_metrics_endpoint(client):
+    game_id = Game.query.first().id
+    for _ in range(3):
+        assert client.get('/games').status_code == 200
+    client.get(f'/game{game_id}/players')
+    client.get('/game999999/players')
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+
+    assert sample(text, 'pokester_requests_total',
+                  route='/games', method='GET', status=200) == 3
+    route = '/game<int:game_id>/players'
+    assert sample(text, 'pokester_requests_total', route=route, method='GET', status=200) == 1
+    assert sample(text, 'pokester_requests_total', route=route, method='GET', status=404) == 1
+    assert sample(text, 'pokester_request_duration_seconds_count',
+                  route='/games', method='GET') == 3
+    # /games is a count and a page query
+    assert sample(text, 'pokester_sql_statements_per_request_sum', route='/games') == 6
+    assert sample(text, 'pokester_sql_duration_seconds_per_request_sum', route='/games') > 0
+    assert 'pokester_token_cache_hits_total' in text
+
+
+def test_metrics_off():
+    app = create_app({'TESTING': True, 'METRICS': '0'}, dburl=TEST_DB_URL)
+    assert app.test_client().get('/metrics').status_code == 404
@@ -0,0 +1,76 @@
+import os
+import threading
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from flaskr.pool import MeteredQueuePool, engine_options, pool_stats, dispose_after_fork
+
+
+def test_engine_options_from_config_and_env(monkeypatch):
+    app = Flask(__name__)
+    app.config['DB_POOL_SIZE'] = 3
+    monkeypatch.setenv('DB_MAX_OVERFLOW', '2')
+    monkeypatch.setenv('DB_POOL_PRE_PING', 'false')
+
+    options = engine_options(app, 'postgresql://u@localhost/pokester')
+    assert options['poolclass'] is MeteredQueuePool
+    assert options['pool_size'] == 3
+    assert options['max_overflow'] == 2
+    assert options['pool_timeout'] == 30
+    assert options['pool_recycle'] == 1800
+    assert options['pool_pre_ping'] is False
+
+    # sqlite keeps its own pool class
+    assert 'poolclass' not in engine_options(app, 'sqlite:////tmp/x.db')
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/pool.db', poolclass=MeteredQueuePool,
+                           pool_size=1, max_overflow=1, pool_timeout=0.2,
+                           connect_args={'check_same_thread': False})
+    yield engine
+    engine.dispose()
+
+
+def test_pool_stats(engine):
+    first = engine.connect()
+    second = engine.connect()
+    stats = pool_stats(engine)
+    assert stats['checked_out'] == 2
+    assert stats['overflow'] == 1
+
+    # both connections taken, a third waits out the timeout
+    with pytest.raises(Exception):
+        engine.connect()
+    stats = pool_stats(engine)
+    assert stats['timeouts'] == 1
+    assert stats['max_wait_seconds'] >= 0.2
+
+    # a waiting checkout gets the connection as soon as it's returned
+    threading.Timer(0.05, first.close).start()
+    engine.connect().close()
+    second.close()
+    stats = pool_stats(engine)
+    assert stats['checkouts'] == 4
+    assert stats['checked_out'] == 0
+
+    engine.dispose()
+    assert pool_stats(engine)['checkouts'] == 4
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_child_gets_a_fresh_pool(engine):
+    dispose_after_fork(engine)
+    engine.connect().close()
+    assert pool_stats(engine)['idle'] == 1
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write, b'%d' % pool_stats(engine)['idle'])
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 10) == b'0'
+    # the parent let its idle connection go before forking
+    assert pool_stats(engine)['idle'] == 0
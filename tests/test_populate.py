@@ -0,0 +1,36 @@
+import io
+from sqlalchemy import create_engine, func, select
+from flaskr.models import db, Game, Registration
+import populate_test_db
+
+
+def populated(chunk, seed=7):
+    engine = create_engine('sqlite://')
+    db.Model.metadata.create_all(engine)
+    populate_test_db.populate(engine, hosts=5, players=40, games=60, seed=seed,
+                              chunk=chunk, out=io.StringIO())
+    return engine
+
+
+def dump(engine):
+    # updated_at is the time of the run
+    tables = {table: [c for c in table.c if c.name != 'updated_at']
+              for table in db.Model.metadata.sorted_tables}
+    return {table.name: engine.execute(select(columns).order_by(*table.primary_key)).fetchall()
+            for table, columns in tables.items()}
+
+
+def test_same_seed_same_data_whatever_the_chunk():
+    one, other = populated(chunk=7), populated(chunk=1000)
+    assert dump(one) == dump(other)
+    assert dump(one) != dump(populated(chunk=7, seed=8))
+
+
+def test_seats_match_registrations():
+    engine = populated(chunk=7)
+    counts = dict(tuple(row) for row in engine.execute(
+        select([Registration.game_id, func.count()]).group_by(Registration.game_id)))
+    games = engine.execute(select([Game.id, Game.num_registered, Game.max_players])).fetchall()
+    assert len(games) == 60
+    for game_id, num_registered, max_players in games:
+        assert num_registered == counts.get(game_id, 0) <= max_players
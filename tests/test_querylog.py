@@ -0,0 +1,79 @@
+import pytest
+from flaskr import create_app
+from flaskr.models import Game
+from flaskr.querylog import QueryReport
+from helpers import TEST_DB_URL
+
+
+@pytest.fixture(scope='module')
+def client():
+    app = create_app({'TESTING': True, 'QUERY_DEBUG': True}, dburl=TEST_DB_URL)
+    with app.app_context():
+        yield app.test_client()
+
+
+def test_report():
+    report = QueryReport('/x', 'GET', repeat_threshold=2, slow_seconds=0.1)
+    report.add('SELECT * FROM game WHERE id = ?', 0.001)
+    report.add('SELECT *\n  FROM game WHERE id = ?', 0.002)
+    report.add('SELECT * FROM player', 0.5)
+    assert report.count == 3
+    assert report.repeated == {'SELECT * FROM game WHERE id = ?': 2}
+    assert report.slow == [('SELECT * FROM player', 0.5)]
+    assert report.summary() == '3 queries; 503.0ms; 1 repeated; 1 slow'
+
+
+def test_header(client):
+    game_id = Game.query.first().id
+    response = client.get(f'/game{game_id}/players')
+    assert response.headers['X-Query-Report'].startswith('2 queries;')
+
+
+BUDGET_TEST = '''
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from flaskr.querylog import setup_querylog
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    engine = create_engine('sqlite://')
+    setup_querylog(app, {'primary': engine})
+
+    @app.route('/n<int:n>')
+    def n_queries(n):
+        for i in range(n):
+            engine.execute('SELECT %d' % i)
+        return ''
+
+    @app.route('/loop')
+    def loop():
+        for i in range(3):
+            engine.execute('SELECT ?', i)
+        return ''
+    return app.test_client()
+
+@pytest.mark.query_budget({'/n<int:n>': 2})
+def test_within(client):
+    client.get('/n2')
+
+@pytest.mark.query_budget(2)
+def test_over(client):
+    client.get('/n3')
+
+@pytest.mark.query_budget(5)
+def test_repeats(client):
+    client.get('/loop')
+
+@pytest.mark.query_budget(5, allow_repeats=True)
+def test_repeats_allowed(client):
+    client.get('/loop')
+'''
+
+
+def test_budget_plugin(testdir):
+    testdir.makepyfile(BUDGET_TEST)
+    result = testdir.runpytest('-p', 'flaskr.querybudget')
+    result.assert_outcomes(passed=2, failed=2)
+    result.stdout.fnmatch_lines(['*3 queries, budget 2*', '*repeated x3: SELECT ?*'])
@@ -0,0 +1,135 @@
+import shutil
+import pytest
+from sqlalchemy import create_engine
+from flaskr import create_app
+from flaskr.models import db, Game, Player, Registration
+from flaskr.replicas import read_only
+from helpers import TEST_DB_URL, TEST_DB_IN_MEMORY
+
+pytestmark = pytest.mark.skipif(TEST_DB_IN_MEMORY or not TEST_DB_URL.startswith('sqlite:///'),
+                                reason='replicas are copies of the sqlite test db file')
+
+
+@pytest.fixture
+def replica_urls(tmp_path):
+    # two "replicas" that have each drifted from the primary in a way
+    # we can see: game one's platform
+    primary = TEST_DB_URL[len('sqlite:///'):]
+    urls = []
+    for name in ('a', 'b'):
+        path = tmp_path / f'replica_{name}.db'
+        shutil.copy(primary, path)
+        url = f'sqlite:///{path}'
+        create_engine(url).execute(f"UPDATE game SET platform = 'replica-{name}'")
+        urls.append(url)
+    return urls
+
+
+def make_client(replica_urls, **config):
+    app = create_app({'TESTING': True, 'TEST_WITHOUT_AUTH': True,
+                      'DATABASE_REPLICA_URLS': replica_urls, **config}, dburl=TEST_DB_URL)
+    client = app.test_client()
+    client.replicas = app.extensions['replicas']
+    return client
+
+
+def platforms(client):
+    response = client.get('/games?page_length=1')
+    assert response.status_code == 200
+    return response.json['games'][0]['platform']
+
+
+def test_reads_round_robin(replica_urls):
+    client = make_client(replica_urls)
+    assert [platforms(client) for _ in range(4)] == ['replica-a', 'replica-b'] * 2
+    assert client.replicas.stats()['reads'] == 4
+
+
+@pytest.fixture
+def app(replica_urls):
+    client = make_client(replica_urls)
+    with client.application.app_context():
+        yield client.application
+
+
+def test_writes_stay_on_primary(app, rollback):
+    client = app.test_client()
+    game = Game.query.filter(Game.num_registered < Game.max_players).first()
+    player_id = Player.query.first().id
+    game_id, num_registered = game.id, game.num_registered
+    response = client.post(f'/game{game_id}/join?user_id={player_id}')
+    assert response.status_code == 200
+    assert response.json['game']['num_registered'] == num_registered + 1
+    assert response.json['game']['platform'] not in ('replica-a', 'replica-b')
+    assert app.extensions['replicas'].stats()['reads'] == 0
+
+
+def seat(game_id, player_id):
+    db.session.add(Registration(game_id=game_id, player_id=player_id))
+    db.session.flush()
+
+
+def registered(connection, game_id, player_id):
+    return connection.execute(
+        'SELECT count(*) FROM registration WHERE game_id = ? AND player_id = ?',
+        game_id, player_id).scalar()
+
+
+@read_only
+def platform(game_id):
+    return db.session.query(Game.platform).filter(Game.id == game_id).scalar()
+
+
+def test_read_after_write_reads_primary(app, rollback):
+    game = Game.query.filter(Game.num_registered < Game.max_players).first()
+    player_id = Player.query.first().id
+    primary = game.platform
+    with app.test_request_context():
+        assert platform(game.id) in ('replica-a', 'replica-b')
+        # a read only view after a write in the same request
+        seat(game.id, player_id)
+        assert platform(game.id) == primary
+    # the next request is back on the replicas
+    with app.test_request_context():
+        assert platform(game.id) in ('replica-a', 'replica-b')
+
+
+def test_flush_inside_read_only_goes_to_primary(app, rollback):
+    game = Game.query.filter(Game.num_registered < Game.max_players).first()
+    player_id = Player.query.first().id
+
+    @read_only
+    def write_then_read():
+        before = db.session.query(Game.platform).filter(Game.id == game.id).scalar()
+        seat(game.id, player_id)
+        after = db.session.query(Game.platform).filter(Game.id == game.id).scalar()
+        return before, after
+
+    with app.test_request_context():
+        before, after = write_then_read()
+    assert before in ('replica-a', 'replica-b')
+    assert after == game.platform
+    # the row is in the primary's transaction, not on a replica
+    assert registered(rollback, game.id, player_id) == 1
+    for engine in app.extensions['replicas'].engines:
+        assert registered(engine, game.id, player_id) == 0
+
+
+def test_cached_views_read_primary(replica_urls):
+    client = make_client(replica_urls, RESPONSE_CACHE='local')
+    assert platforms(client) not in ('replica-a', 'replica-b')
+    assert client.replicas.stats()['reads'] == 0
+
+
+def test_failover(replica_urls, tmp_path):
+    # the first replica can't be opened
+    bad = f'sqlite:///{tmp_path}/missing/replica.db'
+    client = make_client([bad, replica_urls[1]])
+    assert [platforms(client) for _ in range(3)] == ['replica-b'] * 3
+    stats = client.replicas.stats()
+    assert stats['failovers'] == 1
+    assert stats['healthy'] == 1
+
+    # with every replica down the primary answers
+    client = make_client([bad])
+    assert platforms(client) not in ('replica-a', 'replica-b')
@@ -0,0 +1,121 @@
+import time
+import threading
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from flaskr import create_app
+from flaskr.models import db, Host, Game, Player, Registration, unit_of_work
+from helpers import TEST_DB_URL, TEST_DB_IN_MEMORY
+
+N_PLAYERS = 24
+MAX_PLAYERS = 6
+
+# shared cache in memory sqlite fails a writer that would have to wait
+# ('database table is locked') instead of waiting, so races can't run on it
+races = pytest.mark.skipif(TEST_DB_IN_MEMORY, reason='in memory sqlite has no lock waits')
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app({'TESTING': True, 'TEST_WITHOUT_AUTH': True}, dburl=TEST_DB_URL)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def game_and_players(app):
+    host_id = Host.query.first().id
+    game = Game(start_time=datetime.now() + timedelta(days=5),
+                max_players=MAX_PLAYERS, platform='stress', host_id=host_id)
+    players = [Player(id=f'auth0|stress{i}', name=f'stress{i}', email='s@s.com')
+               for i in range(N_PLAYERS)]
+    db.session.add(game)
+    db.session.add_all(players)
+    db.session.commit()
+    game_id = game.id
+    player_ids = [p.id for p in players]
+    db.session.close()
+    yield game_id, player_ids
+    Registration.query.filter_by(game_id=game_id).delete()
+    Game.query.filter_by(id=game_id).delete()
+    Player.query.filter(Player.id.in_(player_ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def race(app, urls, method):
+    # every thread gets its own client, session and connection, then they
+    # all go at once
+    statuses = []
+    barrier = threading.Barrier(len(urls))
+
+    def run(url):
+        with app.app_context():
+            client = app.test_client()
+            barrier.wait()
+            statuses.append(getattr(client, method)(url).status_code)
+            db.session.remove()
+
+    threads = [threading.Thread(target=run, args=(url,)) for url in urls]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return statuses, time.perf_counter() - start
+
+
+@races
+def test_concurrent_joins_never_overbook(app, game_and_players):
+    game_id, player_ids = game_and_players
+    urls = [f'/game{game_id}/join?user_id={p}' for p in player_ids]
+    statuses, elapsed = race(app, urls, 'post')
+    print(f'\n{len(urls)} concurrent joins: {len(urls) / elapsed:.0f} joins/sec')
+
+    assert statuses.count(200) == MAX_PLAYERS
+    assert statuses.count(422) == N_PLAYERS - MAX_PLAYERS
+    game = Game.query.get(game_id)
+    assert game.num_registered == MAX_PLAYERS
+    assert Registration.query.filter_by(game_id=game_id).count() == MAX_PLAYERS
+
+
+@races
+def test_concurrent_double_join_and_unregister(app, game_and_players):
+    game_id, player_ids = game_and_players
+    # the same player hammering join only gets one seat
+    urls = [f'/game{game_id}/join?user_id={player_ids[0]}'] * 8
+    statuses, _ = race(app, urls, 'post')
+    assert statuses.count(200) == 1
+    assert Game.query.get(game_id).num_registered == 1
+    db.session.close()
+
+    # and only gives it back once
+    urls = [f'/game{game_id}/unregister?user_id={player_ids[0]}'] * 8
+    statuses, _ = race(app, urls, 'delete')
+    assert statuses.count(200) == 1
+    assert statuses.count(404) == 7
+    assert Game.query.get(game_id).num_registered == 0
+
+
+def test_unit_of_work_commits_once(app):
+    commits = []
+    listen = lambda session: commits.append(1)
+    event.listen(db.session(), 'after_commit', listen)
+    try:
+        with unit_of_work():
+            Player(id='auth0|uow1', name='uow1', email='u@u.com').add(commit=False)
+            with unit_of_work():
+                Player(id='auth0|uow2', name='uow2', email='u@u.com').add(commit=False)
+            assert commits == []
+        assert commits == [1]
+
+        with pytest.raises(LookupError):
+            with unit_of_work():
+                Player.query.get('auth0|uow1').delete(commit=False)
+                raise LookupError
+        assert commits == [1]
+        assert Player.query.get('auth0|uow1') is not None
+    finally:
+        event.remove(db.session(), 'after_commit', listen)
+        Player.query.filter(Player.id.in_(['auth0|uow1', 'auth0|uow2'])).\
+            delete(synchronize_session=False)
+        db.session.commit()
@@ -0,0 +1,41 @@
+import pytest
+from flask import Flask
+from flaskr.settings import env_flag, setting
+
+
+@pytest.mark.parametrize('value, default, expected', [
+    ('1', False, True),
+    ('yes', False, True),
+    ('0', True, False),
+    ('Off', True, False),
+    (' false ', True, False),
+    ('', True, True),
+    ('', False, False),
+    (None, True, True),
+    (False, True, False),
+])
+def test_env_flag(monkeypatch, value, default, expected):
+    monkeypatch.delenv('SOME_FLAG', raising=False)
+    app = Flask(__name__)
+    if value is not None:
+        app.config['SOME_FLAG'] = value
+    assert env_flag(app, 'SOME_FLAG', default) is expected
+
+
+def test_env_flag_from_environment(monkeypatch):
+    app = Flask(__name__)
+    monkeypatch.setenv('SOME_FLAG', 'no')
+    assert env_flag(app, 'SOME_FLAG', True) is False
+    # app config wins
+    app.config['SOME_FLAG'] = '1'
+    assert env_flag(app, 'SOME_FLAG') is True
+
+
+def test_setting(monkeypatch):
+    app = Flask(__name__)
+    monkeypatch.setenv('SOME_SETTING', '  7 ')
+    assert setting(app, 'SOME_SETTING', 3) == '7'
+    monkeypatch.setenv('SOME_SETTING', ' ')
+    assert setting(app, 'SOME_SETTING', 3) == 3
+    app.config['SOME_SETTING'] = 5
+    assert setting(app, 'SOME_SETTING', 3) == 5